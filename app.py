@@ -5,479 +5,260 @@ Alternativa ligera a Gradio para evitar problemas de dependencias.
 # Force rebuild commit
 """
 
-from flask import Flask, render_template, request, jsonify, send_from_directory
+from flask import Flask, Response, render_template, request, jsonify, send_from_directory
 import os
+import gzip
 import base64
+import hashlib
+import threading
+from collections import OrderedDict
 from io import BytesIO
-from PIL import Image, ImageFilter
+from PIL import Image, ImageEnhance, ImageFilter, ImageStat
 import logging
 import numpy as np
 import cv2
 from skimage.metrics import structural_similarity, peak_signal_noise_ratio
 
+from src.utils.imagen import fast_bilateral_filter
+
+# Codificación base64 acelerada con SIMD (opcional)
+try:
+    import pybase64 as b64codec
+except ImportError:
+    b64codec = base64
+
+# Serialización JSON acelerada con orjson (opcional)
+try:
+    import orjson
+    from flask.json.provider import DefaultJSONProvider
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB para imágenes HD/4K
 
-# Crear directorio para uploads si no existe
-os.makedirs('temp_uploads', exist_ok=True)
+if ORJSON_AVAILABLE:
+    class OrjsonProvider(DefaultJSONProvider):
+        """Proveedor JSON basado en orjson con soporte nativo de escalares numpy."""
 
-@app.route('/')
-def index():
-    """Página principal con interfaz de usuario completa."""
-    logger.info("Acceso a página principal")
-    return """
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>🎨 Sistema de Restauración y Enhancement de Imágenes</title>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); min-height: 100vh; color: #333; }
-        .container { max-width: 1200px; margin: 0 auto; padding: 20px; }
-        .header { text-align: center; color: white; margin-bottom: 30px; }
-        .header h1 { font-size: 2.5em; margin-bottom: 10px; text-shadow: 2px 2px 4px rgba(0,0,0,0.3); }
-        .presentation { background: rgba(255, 255, 255, 0.95); color: #333; padding: 25px; border-radius: 15px; margin-bottom: 30px; box-shadow: 0 8px 25px rgba(0,0,0,0.15); }
-        .main-content { background: white; border-radius: 15px; padding: 30px; box-shadow: 0 10px 30px rgba(0,0,0,0.2); margin-bottom: 20px; }
-        .upload-section { text-align: center; margin-bottom: 30px; border: 2px dashed #ddd; border-radius: 10px; padding: 40px; transition: all 0.3s ease; }
-        .upload-section:hover { border-color: #667eea; background: #f8f9ff; }
-        .file-input { display: none; }
-        .upload-button { background: #667eea; color: white; padding: 15px 30px; border: none; border-radius: 8px; font-size: 16px; cursor: pointer; transition: all 0.3s ease; margin: 10px; }
-        .upload-button:hover { background: #5a6fd8; transform: translateY(-2px); }
-        .settings { display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 20px; margin-bottom: 30px; }
-        .setting-group { background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #667eea; }
-        .setting-group h3 { margin-bottom: 15px; color: #333; font-size: 1.1em; }
-        select, input[type="number"] { width: 100%; padding: 10px; border: 1px solid #ddd; border-radius: 5px; font-size: 14px; margin-bottom: 10px; }
-        .process-button { background: #28a745; color: white; padding: 15px 40px; border: none; border-radius: 8px; font-size: 18px; cursor: pointer; transition: all 0.3s ease; width: 100%; margin-top: 20px; }
-        .process-button:hover { background: #218838; transform: translateY(-2px); }
-        .process-button:disabled { background: #6c757d; cursor: not-allowed; transform: none; }
-        .results { display: none; grid-template-columns: 1fr 1fr; gap: 30px; margin-top: 30px; }
-        .image-container { text-align: center; }
-        .image-container h3 { margin-bottom: 15px; color: #333; }
-        .image-preview { max-width: 100%; border-radius: 8px; box-shadow: 0 4px 15px rgba(0,0,0,0.1); margin-bottom: 15px; }
-        .report { background: #f8f9fa; padding: 20px; border-radius: 8px; border-left: 4px solid #28a745; white-space: pre-line; font-family: 'Courier New', monospace; font-size: 14px; max-height: 400px; overflow-y: auto; margin-top: 20px; }
-        .loading { display: none; text-align: center; margin: 20px 0; }
-        .spinner { border: 4px solid #f3f3f3; border-top: 4px solid #667eea; border-radius: 50%; width: 40px; height: 40px; animation: spin 1s linear infinite; margin: 0 auto 10px; }
-        @keyframes spin { 0% { transform: rotate(0deg); } 100% { transform: rotate(360deg); } }
-        .error { background: #f8d7da; color: #721c24; padding: 15px; border-radius: 5px; border-left: 4px solid #dc3545; margin: 20px 0; display: none; }
-        .footer { text-align: center; color: white; margin-top: 30px; opacity: 0.8; }
-
-        /* Estilos específicos para la sección de presentación */
-        .presentation h2 {
-            color: #667eea;
-            margin-bottom: 35px;
-            font-size: 1.8em;
-            text-align: center;
-        }
-
-        .presentation h3 {
-            color: #5a6fd8;
-            margin: 40px 0 20px 0;
-            font-size: 1.3em;
-        }
-
-        .presentation p {
-            line-height: 1.8;
-            margin-bottom: 25px;
-        }
-
-        .presentation ul {
-            margin: 20px 0 30px 0;
-            padding-left: 30px;
-        }
-
-        .presentation li {
-            margin-bottom: 15px;
-            line-height: 1.6;
-        }
-
-        .presentation .academic-info {
-            margin-bottom: 30px !important;
-        }
-
-        @media (max-width: 768px) { .results { grid-template-columns: 1fr; } .settings { grid-template-columns: 1fr; } .header h1 { font-size: 2em; } }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="header">
-            <h1>🎨 Sistema de Restauración y Enhancement de Imágenes</h1>
-            <p>Procesamiento avanzado con técnicas de deep learning • IFTS °24 Año 2025</p>
-        </div>
-
-        <div class="presentation">
-            <h2>📚 Información del Proyecto</h2>
-            <div style="background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%); padding: 15px; border-radius: 8px; margin-bottom: 20px; border-left: 4px solid #667eea;">
-                <strong>Profesor:</strong> Matías Barreto<br>
-                <strong>Alumno:</strong> Ana Lujan<br>
-                <strong>Materia:</strong> Procesamiento de Imagen<br>
-                <strong>Institución:</strong> IFTS 24 - Ciencia de Datos e Inteligencia Artificial
-            </div>
-
-            <h3>🎯 Trabajo sobre: Restauración y Enhancement</h3>
-            <p><em>Ideal si te interesa: Mejorar la calidad visual y ajustar las características de las imágenes.</em></p>
-
-            <h3>💡 Casos de Uso</h3>
-            <ul>
-                <li><strong>Ajuste inteligente de iluminación y contraste.</strong></li>
-                <li><strong>Corrección de color automática.</strong></li>
-                <li><strong>Mejora de nitidez adaptativa.</strong></li>
-                <li><strong>Reducción de artefactos de compresión.</strong></li>
-                <li><strong>HDR: Combinación de múltiples exposiciones.</strong></li>
-            </ul>
-
-            <h3>🤖 Modelos Sugeridos</h3>
-            <ul>
-                <li><strong>Modelos de difusión para image-to-image con prompts descriptivos.</strong></li>
-                <li><strong>InstantID o similares para preservar la identidad mientras se mejora la calidad.</strong></li>
-                <li><strong>ControlNet con edge detection (detección de bordes) para una mejora guiada.</strong></li>
-            </ul>
-
-            <h3>🔬 Conceptos de Procesamiento Digital Aplicados</h3>
-            <ul>
-                <li><strong>Histogramas y ecualización.</strong></li>
-                <li><strong>Transformaciones de intensidad.</strong></li>
-                <li><strong>Filtros de realce.</strong></li>
-                <li><strong>Operaciones morfológicas.</strong></li>
-            </ul>
-
-            <p>Este proyecto demuestra cómo la integración de técnicas clásicas de procesamiento de imágenes con modelos modernos de aprendizaje profundo puede crear soluciones poderosas y accesibles para mejorar la calidad visual de las imágenes.</p>
-        </div>
-
-        <div class="main-content">
-            <div class="upload-section" id="uploadSection">
-                <h2>📤 Subir Imagen</h2>
-                <p>Arrastra y suelta una imagen aquí, o haz clic para seleccionar</p>
-                <input type="file" id="imageInput" class="file-input" accept="image/*">
-                <br>
-                <button class="upload-button" onclick="document.getElementById('imageInput').click()">Seleccionar Imagen</button>
-                <div id="fileInfo"></div>
-            </div>
-
-            <div class="settings">
-                <div class="setting-group">
-                    <h3>🎯 Tipo de Procesamiento</h3>
-                    <select id="enhancementType">
-                        <option value="restauracion">Restauración</option>
-                        <option value="enhancement">Super-Resolución</option>
-                    </select>
-                </div>
-                <div class="setting-group">
-                    <h3>🔧 Método</h3>
-                    <select id="enhancementMethod">
-                        <option value="opencv">OpenCV (Procesamiento clásico)</option>
-                        <option value="beauty_face">Beauty Face Pro (Belleza Facial Profesional)</option>
-                        <option value="perfect_enhancement">Perfect Enhancement (Mejora Perfecta Total)</option>
-                        <option value="black_white">Black & White (Blanco y Negro Profesional)</option>
-                        <option value="vintage_filters">Vintage Filters (Filtros Vintage)</option>
-                        <option value="srcnn">SRCNN (Red Neuronal Convolucional)</option>
-                        <option value="real-esrgan">Real-ESRGAN x4 (Super-Resolución SOTA)</option>
-                        <option value="gfpgan">GFPGAN (Restauración Facial)</option>
-                    </select>
-                </div>
-                <div class="setting-group">
-                    <h3>📏 Factor de Escala</h3>
-                    <select id="scaleFactor">
-                        <option value="2">2x</option>
-                        <option value="4">4x</option>
-                    </select>
-                </div>
-                <div class="setting-group">
-                    <h3>📊 Modo</h3>
-                    <select id="processingMode">
-                        <option value="single">Procesamiento Individual</option>
-                        <option value="batch">Procesamiento por Lotes</option>
-                    </select>
-                </div>
-            </div>
-
-            <button class="process-button" id="processButton" onclick="processImage()" disabled>🚀 Procesar Imagen</button>
-
-            <div class="loading" id="loading">
-                <div class="spinner"></div>
-                <p>Procesando imagen... Esto puede tomar unos segundos.</p>
-            </div>
-
-            <div class="error" id="error"></div>
-
-            <div class="results" id="results">
-                <div class="image-container">
-                    <h3>📷 Imagen Original</h3>
-                    <img id="originalImage" class="image-preview" alt="Imagen original">
-                </div>
-                <div class="image-container">
-                    <h3>✨ Imagen Procesada</h3>
-                    <img id="processedImage" class="image-preview" alt="Imagen procesada">
-                    <br>
-                    <button id="downloadBtn" onclick="downloadImage()" style="display: none; margin-top: 10px;">⬇️ Descargar Imagen</button>
-                </div>
-            </div>
-
-            <div class="report" id="report" style="display: none;"></div>
-
-            <div class="analytics" id="analytics" style="display: none; margin-top: 30px; padding: 20px; background: #f8f9fa; border-radius: 8px;">
-                <h3>📊 Dashboard de Analytics</h3>
-                <div id="analyticsContent"></div>
-            </div>
-        </div>
-
-        <div class="footer">
-            <p>Desarrollado con técnicas avanzadas de procesamiento de imágenes • IFT 2025</p>
-        </div>
-    </div>
-
-    <script>
-        let selectedFile = null;
-
-        const uploadSection = document.getElementById('uploadSection');
-        const imageInput = document.getElementById('imageInput');
-        const fileInfo = document.getElementById('fileInfo');
-        const processButton = document.getElementById('processButton');
-
-        uploadSection.addEventListener('dragover', (e) => {
-            e.preventDefault();
-            uploadSection.classList.add('dragover');
-        });
-
-        uploadSection.addEventListener('dragleave', () => {
-            uploadSection.classList.remove('dragover');
-        });
-
-        uploadSection.addEventListener('drop', (e) => {
-            e.preventDefault();
-            uploadSection.classList.remove('dragover');
-            const files = e.dataTransfer.files;
-            if (files.length > 0) {
-                handleFileSelect(files[0]);
-            }
-        });
-
-        imageInput.addEventListener('change', (e) => {
-            if (e.target.files.length > 0) {
-                handleFileSelect(e.target.files[0]);
-            }
-        });
+        def dumps(self, obj, **kwargs):
+            try:
+                return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+            except TypeError:
+                # Tipos no soportados por orjson: usar el codificador por defecto
+                return super().dumps(obj, **kwargs)
 
-        function handleFileSelect(file) {
-            if (!file.type.startsWith('image/')) {
-                alert('Por favor selecciona un archivo de imagen válido.');
-                return;
-            }
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
 
-            selectedFile = file;
-            fileInfo.innerHTML = `<p><strong>Archivo seleccionado:</strong> ${file.name} (${(file.size / 1024 / 1024).toFixed(2)} MB)</p>`;
+    app.json = OrjsonProvider(app)
 
-            const reader = new FileReader();
-            reader.onload = (e) => {
-                document.getElementById('originalImage').src = e.target.result;
-            };
-            reader.readAsDataURL(file);
+app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB para imágenes HD/4K
+# Detrás de nginx/apache delegar la transferencia de ficheros estáticos (X-Sendfile)
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '0') == '1'
 
-            processButton.disabled = false;
-        }
+# Límite de píxeles por imagen (8K): se comprueba explícitamente con la cabecera antes
+# de decodificar, ya que cv2.imdecode ignora Image.MAX_IMAGE_PIXELS y PIL solo avisa hasta el doble
+MAX_IMAGE_PIXELS = 8192 * 8192
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
 
-        function downloadImage() {
-            if (currentDownloadUrl) {
-                window.open(currentDownloadUrl, '_blank');
-            }
-        }
 
-        async function loadAnalytics() {
-            try {
-                const response = await fetch('/api/analytics');
-                const data = await response.json();
-                const content = document.getElementById('analyticsContent');
-                content.innerHTML = `
-                    <div style="display: grid; grid-template-columns: repeat(auto-fit, minmax(150px, 1fr)); gap: 15px; margin-top: 15px;">
-                        <div style="text-align: center; padding: 10px; background: white; border-radius: 5px;">
-                            <strong>Procesadas</strong><br>${data.total_processed}
-                        </div>
-                        <div style="text-align: center; padding: 10px; background: white; border-radius: 5px;">
-                            <strong>PSNR Avg</strong><br>${data.average_psnr} dB
-                        </div>
-                        <div style="text-align: center; padding: 10px; background: white; border-radius: 5px;">
-                            <strong>SSIM Avg</strong><br>${data.average_ssim}
-                        </div>
-                        <div style="text-align: center; padding: 10px; background: white; border-radius: 5px;">
-                            <strong>Uptime</strong><br>${data.uptime}
-                        </div>
-                    </div>
-                `;
-                document.getElementById('analytics').style.display = 'block';
-            } catch (err) {
-                console.error('Error cargando analytics:', err);
-            }
-        }
+class ImageTooLargeError(ValueError):
+    """La imagen supera MAX_IMAGE_PIXELS."""
 
-        let currentDownloadUrl = null;
+# Crear directorio para uploads si no existe
+os.makedirs('temp_uploads', exist_ok=True)
 
-        function formatStructuredReport(report) {
-            let html = `<div style="font-family: Arial, sans-serif; line-height: 1.6;">`;
+# Objetos reutilizables por hilo (cache de CLAHE)
+_tls = threading.local()
 
-            // Estado y método
-            html += `<h4 style="color: ${report.status.includes('✅') ? '#28a745' : report.status.includes('⚠️') ? '#ffc107' : '#dc3545'}; margin-bottom: 15px;">${report.status || 'Estado desconocido'}</h4>`;
-            html += `<p><strong>🎯 Método aplicado:</strong> ${report.method || 'Método no especificado'}</p>`;
-            html += `<p><strong>🛠️ Tecnología:</strong> ${report.technology || 'Tecnología no especificada'}</p>`;
 
-            // Métricas
-            html += `<div style="background: #f8f9fa; padding: 10px; border-radius: 5px; margin: 15px 0;">`;
-            html += `<h5 style="margin: 0 0 10px 0; color: #495057;">📊 Métricas de Calidad</h5>`;
-            if (report.metrics && report.metrics.psnr !== undefined && report.metrics.ssim !== undefined) {
-                html += `<p><strong>PSNR:</strong> ${report.metrics.psnr}</p>`;
-                html += `<p><strong>SSIM:</strong> ${report.metrics.ssim}</p>`;
-            } else {
-                html += `<p><em>Métricas no disponibles</em></p>`;
-            }
-            html += `</div>`;
-
-            // Explicabilidad
-            if (report.explainability) {
-                html += `<div style="background: #e9ecef; padding: 15px; border-radius: 5px; margin: 15px 0;">`;
-                html += `<h5 style="margin: 0 0 10px 0; color: #495057;">🔍 Explicación Técnica (XAI)</h5>`;
-
-                // Diagnóstico
-                if (report.explainability.diagnosis && Array.isArray(report.explainability.diagnosis) && report.explainability.diagnosis.length > 0) {
-                    html += `<p><strong>🔬 Diagnóstico de la imagen:</strong></p>`;
-                    html += `<ul>`;
-                    report.explainability.diagnosis.forEach(item => {
-                        html += `<li>${item}</li>`;
-                    });
-                    html += `</ul>`;
-                }
+def encode_png_base64(image, save_path=None):
+    """
+    Codifica una imagen PIL como PNG en base64 sin copias intermedias del buffer.
 
-                // Técnica aplicada
-                if (report.explainability.technique_applied) {
-                    html += `<p><strong>⚙️ Técnica aplicada:</strong> ${report.explainability.technique_applied}</p>`;
-                }
+    Args:
+        image: Imagen PIL a codificar
+        save_path: Ruta opcional donde escribir los mismos bytes PNG (sin recodificar)
 
-                // Justificación de parámetros
-                if (report.explainability.parameter_justification) {
-                    html += `<p><strong>📋 Justificación de parámetros:</strong> ${report.explainability.parameter_justification}</p>`;
-                }
+    Returns:
+        Cadena base64 del PNG
+    """
+    buffer = BytesIO()
+    # zlib nivel 1: mucho más rápido que el nivel 6 por defecto, sigue siendo sin pérdidas
+    image.save(buffer, format='PNG', compress_level=1)
+    with buffer.getbuffer() as view:
+        if save_path is not None:
+            with open(save_path, 'wb') as f:
+                f.write(view)
+        return b64codec.b64encode(view).decode('utf-8')
 
-                // Interpretación de métricas
-                if (report.explainability.metrics_interpretation && Array.isArray(report.explainability.metrics_interpretation) && report.explainability.metrics_interpretation.length > 0) {
-                    html += `<p><strong>📈 Interpretación de métricas:</strong></p>`;
-                    html += `<ul>`;
-                    report.explainability.metrics_interpretation.forEach(item => {
-                        html += `<li>${item}</li>`;
-                    });
-                    html += `</ul>`;
-                }
 
-                // Detalles técnicos
-                if (report.explainability.technical_details && typeof report.explainability.technical_details === 'object') {
-                    html += `<p><strong>🔧 Detalles técnicos:</strong></p>`;
-                    html += `<ul>`;
-                    Object.entries(report.explainability.technical_details).forEach(([key, value]) => {
-                        if (key === 'error_explicacion') {
-                            html += `<li><strong>Explicación del Error:</strong> ${value}</li>`;
-                        } else if (key !== 'error') {
-                            const label = key.replace(/_/g, ' ').replace(/\b\w/g, l => l.toUpperCase());
-                            html += `<li><strong>${label}:</strong> ${value}</li>`;
-                        }
-                    });
-                    html += `</ul>`;
-                }
+def check_image_header_size(file_bytes):
+    """
+    Comprueba las dimensiones leyendo solo la cabecera, antes de decodificar los píxeles.
 
-                html += `</div>`;
-            }
+    Args:
+        file_bytes: Bytes del fichero subido
 
-            // Descarga
-            if (report.download_url) {
-                html += `<p><strong>⬇️ Descarga:</strong> <a href="${report.download_url}" target="_blank">${report.download_url}</a></p>`;
-            }
+    Raises:
+        ImageTooLargeError: Si la imagen supera MAX_IMAGE_PIXELS
+    """
+    try:
+        # Image.open es perezoso: solo lee la cabecera
+        with Image.open(BytesIO(file_bytes)) as header:
+            width, height = header.size
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    except Exception:
+        # Formato no reconocido por PIL: se valida tras decodificar
+        return
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ImageTooLargeError(
+            f"Imagen demasiado grande: {width}x{height} "
+            f"(máximo {MAX_IMAGE_PIXELS:,} píxeles)")
+
+
+# Cache LRU de resultados: uploads repetidos con los mismos parámetros no se reprocesan
+RESULT_CACHE_MAX_ENTRIES = 64
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_result_cache = OrderedDict()
+_result_cache_bytes = 0
+_result_cache_lock = threading.Lock()
+_result_cache_stats = {'hits': 0, 'misses': 0}
+# Métodos con componente aleatoria (granulado): cada petición debe dar un resultado nuevo
+UNCACHEABLE_METHODS = {'vintage_filters'}
+
+
+def result_cache_key(file_bytes, enhancement_method, enhancement_type, scale_factor):
+    """Clave direccionada por contenido: hash BLAKE2 del upload + parámetros."""
+    digest = hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+    return f"{digest}:{enhancement_method}:{enhancement_type}:{scale_factor}"
+
+
+def result_cache_get(key):
+    """Devuelve el resultado cacheado (o None) y actualiza los contadores."""
+    with _result_cache_lock:
+        result = _result_cache.get(key)
+        if result is None:
+            _result_cache_stats['misses'] += 1
+            return None
+        _result_cache.move_to_end(key)
+        _result_cache_stats['hits'] += 1
+        return result
+
+
+def result_cache_put(key, result):
+    """Guarda un resultado respetando los límites de entradas y de bytes."""
+    global _result_cache_bytes
+    size = len(result.get('image', ''))
+    if size > RESULT_CACHE_MAX_BYTES:
+        return
+    with _result_cache_lock:
+        previous = _result_cache.pop(key, None)
+        if previous is not None:
+            _result_cache_bytes -= len(previous.get('image', ''))
+        _result_cache[key] = result
+        _result_cache_bytes += size
+        while len(_result_cache) > RESULT_CACHE_MAX_ENTRIES or _result_cache_bytes > RESULT_CACHE_MAX_BYTES:
+            _, evicted = _result_cache.popitem(last=False)
+            _result_cache_bytes -= len(evicted.get('image', ''))
+
+
+def get_clahe(clip_limit):
+    """
+    Devuelve un objeto CLAHE reutilizable (tiles 8x8) para el límite dado.
+
+    Los objetos CLAHE de OpenCV no son seguros entre hilos, por lo que se
+    cachean por hilo en lugar de compartirse globalmente.
+
+    Args:
+        clip_limit: Límite de recorte del histograma
+
+    Returns:
+        Objeto cv2.CLAHE
+    """
+    cache = getattr(_tls, 'clahe', None)
+    if cache is None:
+        cache = _tls.clahe = {}
+    clahe = cache.get(clip_limit)
+    if clahe is None:
+        clahe = cache[clip_limit] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8, 8))
+    return clahe
+
+
+_RAMP_L = Image.frombytes('L', (256, 1), bytes(range(256)))
+
+
+def contrast_brightness_point(image, contrast, brightness):
+    """
+    Aplica Contrast(contrast) seguido de Brightness(brightness) de ImageEnhance en una sola pasada.
+
+    Ambos realces son mezclas por canal con una imagen constante, así que se
+    evalúan sobre una rampa de 256 niveles (con la misma aritmética de
+    Image.blend) y el resultado se aplica como tabla con Image.point.
+
+    Args:
+        image: Imagen PIL en modo RGB
+        contrast: Factor de contraste
+        brightness: Factor de brillo
+
+    Returns:
+        Imagen PIL con ambos ajustes aplicados
+    """
+    mean = int(ImageStat.Stat(image.convert('L')).mean[0] + 0.5)
+    ramp = Image.blend(Image.new('L', _RAMP_L.size, mean), _RAMP_L, contrast)
+    ramp = Image.blend(Image.new('L', _RAMP_L.size, 0), ramp, brightness)
+    return image.point(list(ramp.getdata()) * len(image.getbands()))
+
+
+# Tabla de saturación x1.4 (beauty_face): una consulta por píxel en lugar de copia float32 del HSV
+_SATURATION_LUT_14 = np.clip(np.arange(256, dtype=np.float32) * 1.4, 0, 255).astype(np.uint8)
 
-            html += `</div>`;
-            return html;
-        }
 
-        async function processImage() {
-            if (!selectedFile) {
-                alert('Por favor selecciona una imagen primero.');
-                return;
-            }
+# Formateadores de métricas precompilados (evitan reparsear el format-spec en cada petición)
+_format_psnr = '{:.2f} dB'.format
+_format_ssim = '{:.4f}'.format
+
+
+def format_metric(value, formatter):
+    """Formatea una métrica numérica o devuelve su representación textual."""
+    if isinstance(value, (int, float)):
+        return formatter(value)
+    return str(value)
 
-            const loading = document.getElementById('loading');
-            const error = document.getElementById('error');
-            const results = document.getElementById('results');
-            const report = document.getElementById('report');
-
-            loading.style.display = 'block';
-            error.style.display = 'none';
-            results.style.display = 'none';
-            report.style.display = 'none';
-            processButton.disabled = true;
-
-            try {
-                const formData = new FormData();
-                formData.append('image', selectedFile);
-                formData.append('enhancement_type', document.getElementById('enhancementType').value);
-                formData.append('enhancement_method', document.getElementById('enhancementMethod').value);
-                formData.append('scale_factor', document.getElementById('scaleFactor').value);
-
-                const response = await fetch('/process', {
-                    method: 'POST',
-                    body: formData
-                });
-
-                const data = await response.json();
-
-                if (data.success) {
-                    document.getElementById('processedImage').src = data.image;
-
-                    // Mostrar reporte estructurado con explicabilidad
-                    const reportDiv = document.getElementById('report');
-                    reportDiv.innerHTML = formatStructuredReport(data.report);
-                    results.style.display = 'grid';
-                    report.style.display = 'block';
-
-                    // Mostrar botón de descarga
-                    if (data.download_url) {
-                        currentDownloadUrl = data.download_url;
-                        document.getElementById('downloadBtn').style.display = 'block';
-                    }
 
-                    // Cargar analytics
-                    loadAnalytics();
-                } else {
-                    // Error manejado con estructura XAI
-                    const reportDiv = document.getElementById('report');
-                    reportDiv.innerHTML = formatStructuredReport(data.report);
-                    report.style.display = 'block';
-                    // No mostrar imagen procesada, mantener imagen original si existe
-                }
+# Página principal: HTML estático en static/index.html, precomprimido una sola vez al importar
+INDEX_HTML_PATH = os.path.join(app.static_folder, 'index.html')
+with open(INDEX_HTML_PATH, 'rb') as f:
+    _INDEX_HTML_BYTES = f.read()
+_INDEX_HTML_GZIP = gzip.compress(_INDEX_HTML_BYTES, compresslevel=9)
+_INDEX_ETAG = hashlib.md5(_INDEX_HTML_BYTES).hexdigest()
+_INDEX_ETAG_GZIP = f"{_INDEX_ETAG}-gzip"
 
-            } catch (err) {
-                error.textContent = `Error: ${err.message}`;
-                error.style.display = 'block';
-            } finally {
-                loading.style.display = 'none';
-                processButton.disabled = false;
-            }
-        }
 
-        window.addEventListener('load', async () => {
-            try {
-                const response = await fetch('/health');
-                if (!response.ok) {
-                    document.getElementById('error').textContent = 'Error: No se puede conectar con el servidor';
-                    document.getElementById('error').style.display = 'block';
-                }
-            } catch (err) {
-                document.getElementById('error').textContent = 'Error: Servidor no disponible';
-                document.getElementById('error').style.display = 'block';
-            }
-        });
-    </script>
-</body>
-</html>
-"""
+@app.route('/')
+def index():
+    """Página principal con interfaz de usuario completa."""
+    logger.info("Acceso a página principal")
+    if request.if_none_match.contains(_INDEX_ETAG) or request.if_none_match.contains(_INDEX_ETAG_GZIP):
+        return Response(status=304)
+
+    if 'gzip' in request.accept_encodings:
+        response = Response(_INDEX_HTML_GZIP, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(_INDEX_ETAG_GZIP)
+    else:
+        # Sin gzip: Werkzeug sirve el fichero vía wsgi.file_wrapper (sendfile en Linux)
+        response = send_from_directory(app.static_folder, 'index.html', max_age=300, etag=False)
+        response.set_etag(_INDEX_ETAG)
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    response.vary.add('Accept-Encoding')
+    return response
 
 @app.route('/process', methods=['POST'])
 def process():
@@ -494,6 +275,9 @@ def process():
         result = process_single_image(file, request.form)
         return jsonify(result)
 
+    except ImageTooLargeError as e:
+        logger.warning(str(e))
+        return jsonify({'success': False, 'error': str(e)}), 413
     except Exception as e:
         logger.error(f"Error general: {e}")
         return jsonify({'success': False, 'error': 'Error interno del servidor'})
@@ -509,25 +293,63 @@ def process_single_image(file, form_data):
 
         logger.info(f"Procesando: tipo={enhancement_type}, método={enhancement_method}, escala={scale_factor}")
 
+        # Consultar cache por contenido antes de decodificar
+        file_bytes = file.read()
+        file.seek(0)
+        cache_key = None
+        cached_result = None
+        if enhancement_method not in UNCACHEABLE_METHODS:
+            cache_key = result_cache_key(file_bytes, enhancement_method, enhancement_type, scale_factor)
+            cached_result = result_cache_get(cache_key)
+        if cached_result is not None:
+            logger.info(f"Resultado servido desde cache: {cache_key}")
+            # El cache es por contenido: nombre y descarga corresponden a la subida actual
+            filename = f"processed_{os.path.splitext(file.filename)[0]}.png"
+            save_path = os.path.join('temp_uploads', filename)
+            if not os.path.exists(save_path):
+                png_b64 = cached_result['image'].split(',', 1)[1]
+                os.makedirs('temp_uploads', exist_ok=True)
+                with open(save_path, 'wb') as f:
+                    f.write(b64codec.b64decode(png_b64))
+            return dict(cached_result, download_url=f'/download/{filename}')
+
         # Cargar imagen original con validación robusta
         try:
-            image = Image.open(file)
-            logger.info(f"Imagen cargada: formato={image.format}, modo={image.mode}, tamaño={image.size}")
-
-            # Convertir a RGB si es necesario
-            if image.mode not in ['RGB', 'L', 'P']:
-                logger.warning(f"Modo de imagen no estándar: {image.mode}, convirtiendo a RGB")
-                image = image.convert('RGB')
-            elif image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            # Verificar tamaño mínimo
+            check_image_header_size(file_bytes)
+
+            # Decodificación directa a ndarray con OpenCV (sin pasar por el objeto PIL);
+            # se ignora la orientación EXIF para conservar el comportamiento de PIL
+            decoded = cv2.imdecode(np.frombuffer(file_bytes, np.uint8),
+                                   cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+            if decoded is not None:
+                original_array = cv2.cvtColor(decoded, cv2.COLOR_BGR2RGB)
+                image = Image.fromarray(original_array)
+                logger.info(f"Imagen decodificada con OpenCV: tamaño={image.size}")
+            else:
+                # Formatos que OpenCV no soporta (p.ej. GIF): decodificar con PIL
+                image = Image.open(BytesIO(file_bytes))
+                logger.info(f"Imagen cargada: formato={image.format}, modo={image.mode}, tamaño={image.size}")
+
+                # Convertir a RGB si es necesario
+                if image.mode not in ['RGB', 'L', 'P']:
+                    logger.warning(f"Modo de imagen no estándar: {image.mode}, convirtiendo a RGB")
+                    image = image.convert('RGB')
+                elif image.mode != 'RGB':
+                    image = image.convert('RGB')
+                original_array = np.array(image)
+
+            # Verificar tamaño mínimo y máximo
             if image.size[0] < 1 or image.size[1] < 1:
                 raise ValueError("Imagen con dimensiones inválidas")
+            if image.size[0] * image.size[1] > MAX_IMAGE_PIXELS:
+                raise ImageTooLargeError(
+                    f"Imagen demasiado grande: {image.size[0]}x{image.size[1]} "
+                    f"(máximo {MAX_IMAGE_PIXELS:,} píxeles)")
 
-            original_array = np.array(image)
             logger.info(f"Array numpy creado: shape={original_array.shape}, dtype={original_array.dtype}")
 
+        except ImageTooLargeError:
+            raise
         except Exception as load_err:
             logger.error(f"Error cargando imagen: {load_err}")
             raise ValueError(f"No se pudo cargar la imagen: {str(load_err)}")
@@ -543,12 +365,13 @@ def process_single_image(file, form_data):
         # Algoritmos con efectos visuales DRAMÁTICOS y diferenciados
         if enhancement_method == "black_white":
             # Blanco y negro PROFESIONAL con alto contraste
-            img_array = np.array(image)
+            # Reutilizar el array ya decodificado: ninguna operación siguiente lo modifica in situ
+            img_array = original_array
             # Convertir a escala de grises con método profesional
             gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
             # Aplicar CLAHE para alto contraste
-            clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(8,8))
-            enhanced_gray = clahe.apply(gray.astype(np.uint8))
+            clahe = get_clahe(4.0)
+            enhanced_gray = clahe.apply(gray)
             # Ecualización adicional para máximo contraste
             enhanced_gray = cv2.equalizeHist(enhanced_gray)
             # Filtro de nitidez extrema
@@ -560,10 +383,10 @@ def process_single_image(file, form_data):
 
         elif enhancement_method == "perfect_enhancement":
             # Mejora PERFECTA con transformación completa
-            img_array = np.array(image)
+            img_array = original_array
             # CLAHE para contraste dramático
             lab = cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
-            clahe = cv2.createCLAHE(clipLimit=4.0, tileGridSize=(8,8))
+            clahe = get_clahe(4.0)
             lab[:, :, 0] = clahe.apply(lab[:, :, 0])
             img_array = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
             # Ajustes de brillo y contraste extremos
@@ -576,31 +399,30 @@ def process_single_image(file, form_data):
 
         elif enhancement_method == "beauty_face":
             # Belleza facial con efectos dramáticos
-            img_array = np.array(image)
+            img_array = original_array
             # CLAHE agresivo
             lab = cv2.cvtColor(img_array, cv2.COLOR_RGB2LAB)
-            clahe = cv2.createCLAHE(clipLimit=5.0, tileGridSize=(8,8))
+            clahe = get_clahe(5.0)
             lab[:, :, 0] = clahe.apply(lab[:, :, 0])
             img_array = cv2.cvtColor(lab, cv2.COLOR_LAB2RGB)
-            # Suavizado bilateral para piel perfecta
-            img_array = cv2.bilateralFilter(img_array, 11, 80, 80)
+            # Suavizado bilateral para piel perfecta (a media resolución en imágenes grandes)
+            img_array = fast_bilateral_filter(img_array, 11, 80, 80)
             # Ajuste de saturación para pieles vibrantes
-            hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV).astype(np.float32)
-            hsv[:, :, 1] = hsv[:, :, 1] * 1.4
-            hsv = np.clip(hsv, 0, 255).astype(np.uint8)
+            hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
+            hsv[:, :, 1] = cv2.LUT(hsv[:, :, 1], _SATURATION_LUT_14)
             img_array = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
             processed = Image.fromarray(img_array)
             method = "Beauty Face Pro (CLAHE + Bilateral + Saturación)"
 
         elif enhancement_method == "vintage_filters":
             # Filtros vintage con efectos retro dramáticos
-            img_array = np.array(image)
+            img_array = original_array
             # Sepia intenso
             sepia_filter = np.array([[0.393, 0.769, 0.189],
                                     [0.349, 0.686, 0.168],
                                     [0.272, 0.534, 0.131]])
+            # cv2.transform sobre uint8 ya satura a [0, 255]: sin copia float ni clip adicional
             sepia = cv2.transform(img_array, sepia_filter)
-            sepia = np.clip(sepia, 0, 255).astype(np.uint8)
             # Contraste vintage extremo
             sepia = cv2.convertScaleAbs(sepia, alpha=1.3, beta=-30)
             # Granulado de película
@@ -614,15 +436,12 @@ def process_single_image(file, form_data):
                 # Super-resolución con efectos visuales extremos
                 w, h = image.size
                 new_w, new_h = w * scale_factor, h * scale_factor
-                processed = image.resize((new_w, new_h), Image.LANCZOS)
+                # Reescalado en OpenCV sobre el array ya decodificado (multihilo, sin pasar por PIL)
+                processed = Image.fromarray(cv2.resize(original_array, (new_w, new_h), interpolation=cv2.INTER_LANCZOS4))
                 # Aplicar mejoras DRAMÁTICAS
                 processed = processed.filter(ImageFilter.UnsharpMask(radius=2, percent=300, threshold=10))
                 # Ajustes extremos de contraste y brillo
-                from PIL import ImageEnhance
-                enhancer = ImageEnhance.Contrast(processed)
-                processed = enhancer.enhance(2.0)  # Contraste extremo
-                enhancer = ImageEnhance.Brightness(processed)
-                processed = enhancer.enhance(1.3)  # Brillo alto
+                processed = contrast_brightness_point(processed, 2.0, 1.3)  # Contraste extremo + brillo alto
                 enhancer = ImageEnhance.Sharpness(processed)
                 processed = enhancer.enhance(2.5)  # Nitidez máxima
                 method = f"Super-Resolución DRAMÁTICA {scale_factor}x (LANCZOS + Efectos Extremos)"
@@ -631,11 +450,7 @@ def process_single_image(file, form_data):
                 processed = image.filter(ImageFilter.SHARPEN)
                 processed = processed.filter(ImageFilter.UnsharpMask(radius=3, percent=400, threshold=10))
                 # Ajustes de contraste y brillo DRAMÁTICOS
-                from PIL import ImageEnhance
-                enhancer = ImageEnhance.Contrast(processed)
-                processed = enhancer.enhance(1.8)  # Contraste muy alto
-                enhancer = ImageEnhance.Brightness(processed)
-                processed = enhancer.enhance(1.2)  # Brillo aumentado
+                processed = contrast_brightness_point(processed, 1.8, 1.2)  # Contraste muy alto + brillo aumentado
                 enhancer = ImageEnhance.Sharpness(processed)
                 processed = enhancer.enhance(2.0)  # Nitidez máxima
                 # Filtro adicional para definición extrema
@@ -676,17 +491,19 @@ def process_single_image(file, form_data):
                 logger.warning(f"Error calculando PSNR con OpenCV: {e}")
                 try:
                     # Fallback: scikit-image
-                    psnr = peak_signal_noise_ratio(original_array, processed_array, data_range=255)
+                    psnr = float(peak_signal_noise_ratio(original_array, processed_array, data_range=255))
                     logger.info(f"PSNR calculado con scikit-image: {psnr}")
                 except Exception as e2:
                     logger.warning(f"Error calculando PSNR con scikit-image: {e2}")
                     psnr = None
 
             try:
-                # SSIM usando scikit-image
+                # SSIM usando scikit-image sobre luminancia (un canal en lugar de tres)
                 min_side = min(original_array.shape[:2])
                 if min_side >= 7:
-                    ssim = structural_similarity(original_array, processed_array, multichannel=True, data_range=255, channel_axis=2)
+                    original_gray = cv2.cvtColor(original_array, cv2.COLOR_RGB2GRAY)
+                    processed_gray = cv2.cvtColor(processed_array, cv2.COLOR_RGB2GRAY)
+                    ssim = float(structural_similarity(original_gray, processed_gray, data_range=255))
                     logger.info(f"SSIM calculado: {ssim}")
                 else:
                     logger.warning(f"Imagen demasiado pequeña para SSIM: {min_side}x{min_side} < 7x7")
@@ -701,25 +518,16 @@ def process_single_image(file, form_data):
 
         # Crear directorio temp_uploads si no existe y guardar imagen procesada
         os.makedirs('temp_uploads', exist_ok=True)
-        filename = f"processed_{file.filename}"
-        processed.save(os.path.join('temp_uploads', filename))
+        filename = f"processed_{os.path.splitext(file.filename)[0]}.png"
 
-        # Convertir a base64
-        buffer = BytesIO()
-        processed.save(buffer, format='PNG')
-        img_b64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        # Convertir a base64 escribiendo a disco los mismos bytes PNG (una sola codificación)
+        img_b64 = encode_png_base64(processed, save_path=os.path.join('temp_uploads', filename))
 
         # Preparar métricas con valores seguros
-        metrics = {}
-        if isinstance(psnr, (int, float)):
-            metrics['psnr'] = f'{psnr:.2f} dB'
-        else:
-            metrics['psnr'] = str(psnr)
-
-        if isinstance(ssim, (int, float)):
-            metrics['ssim'] = f'{ssim:.4f}'
-        else:
-            metrics['ssim'] = str(ssim)
+        metrics = {
+            'psnr': format_metric(psnr, _format_psnr),
+            'ssim': format_metric(ssim, _format_ssim)
+        }
 
         # Reporte simple sin explicabilidad compleja
         explainability = {
@@ -738,14 +546,20 @@ def process_single_image(file, form_data):
             'explainability': explainability
         }
 
-        return {
+        result = {
             'success': True,
             'image': f'data:image/png;base64,{img_b64}',
             'report': report,
             'metrics': {'psnr': psnr, 'ssim': ssim},
             'download_url': f'/download/{filename}'
         }
+        if cache_key is not None:
+            result_cache_put(cache_key, result)
+        return result
 
+    except ImageTooLargeError:
+        # Rechazo explícito: sin fallback a la imagen original
+        raise
     except Exception as proc_err:
         # DEBUGGING CRÍTICO: Mostrar stack trace completo
         import traceback
@@ -758,14 +572,11 @@ def process_single_image(file, form_data):
         logger.error(f"Error procesamiento: {proc_err}")
         # Fallback con estructura consistente
         try:
-            image.seek(0)
-            orig_image = Image.open(file)
+            orig_image = Image.open(BytesIO(file_bytes))
             if orig_image.mode != 'RGB':
                 orig_image = orig_image.convert('RGB')
 
-            buffer = BytesIO()
-            orig_image.save(buffer, format='PNG')
-            img_b64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            img_b64 = encode_png_base64(orig_image)
 
             # Estructura consistente para frontend
             return {
@@ -817,7 +628,10 @@ def process_single_image(file, form_data):
 def health():
     """Endpoint de salud para verificar que la app funciona."""
     logger.info("Health check solicitado")
-    return jsonify({'status': 'healthy', 'message': 'Sistema de restauración y enhancement operativo'})
+    with _result_cache_lock:
+        cache_info = dict(_result_cache_stats, entries=len(_result_cache))
+    return jsonify({'status': 'healthy', 'message': 'Sistema de restauración y enhancement operativo',
+                    'cache': cache_info})
 
 
 # Para compatibilidad con gunicorn en HF Spaces
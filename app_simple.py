@@ -6,9 +6,7 @@ Alternativa ligera a Gradio para evitar problemas de dependencias.
 
 from flask import Flask, render_template, request, send_file, jsonify
 import os
-import tempfile
-from pathlib import Path
-import base64
+import uuid
 from io import BytesIO
 from PIL import Image
 import numpy as np
@@ -22,9 +20,53 @@ from src.pipeline import process_image_for_gradio
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Crear directorio para uploads temporales
-UPLOAD_FOLDER = Path('temp_uploads')
-UPLOAD_FOLDER.mkdir(exist_ok=True)
+# Límite de píxeles por imagen (8K); se comprueba explícitamente con el tamaño de la
+# cabecera, ya que PIL solo avisa por encima de Image.MAX_IMAGE_PIXELS (error al doble)
+MAX_IMAGE_PIXELS = 8192 * 8192
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Resultados PNG recientes, servidos por /process/result/<id> en lugar de incrustarlos en base64.
+# Se guardan en disco (como app.py) para que cualquier worker de gunicorn pueda servirlos.
+RESULT_DIR = 'temp_uploads'
+RESULT_STORE_MAX = 32
+os.makedirs(RESULT_DIR, exist_ok=True)
+
+
+def result_path(result_id: str) -> str:
+    """Ruta en disco del resultado con el identificador dado."""
+    return os.path.join(RESULT_DIR, f'result_{result_id}.png')
+
+
+def store_result(png_bytes: bytes) -> str:
+    """
+    Guarda un PNG procesado y devuelve su identificador.
+
+    Args:
+        png_bytes: Contenido PNG de la imagen procesada
+
+    Returns:
+        Identificador para /process/result/<id>
+    """
+    result_id = uuid.uuid4().hex
+    path = result_path(result_id)
+    # Escritura atómica: otro worker nunca ve un PNG a medio escribir
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(png_bytes)
+    os.replace(tmp_path, path)
+
+    # Conservar solo los RESULT_STORE_MAX resultados más recientes
+    with os.scandir(RESULT_DIR) as entries:
+        stored = [e for e in entries if e.name.startswith('result_') and e.name.endswith('.png')]
+    if len(stored) > RESULT_STORE_MAX:
+        stored.sort(key=lambda e: e.stat().st_mtime)
+        for entry in stored[:-RESULT_STORE_MAX]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                # Ya eliminado por otro worker
+                pass
+    return result_id
 
 @app.route('/')
 def index():
@@ -52,45 +94,52 @@ def process():
         enhancement_method = request.form.get('enhancement_method', 'opencv')
         scale_factor = int(request.form.get('scale_factor', 2))
 
-        # Guardar archivo temporalmente
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file.filename, dir=UPLOAD_FOLDER) as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
-
-        try:
-            # Leer imagen
-            image = Image.open(temp_path)
-            image_array = np.array(image)
-
-            # Procesar imagen
-            processed_array, report = process_image_for_gradio(
-                image_array,
-                enhancement_type=enhancement_type,
-                enhancement_method=enhancement_method,
-                scale_factor=scale_factor
-            )
-
-            # Convertir a PIL Image
-            processed_image = Image.fromarray(processed_array)
-
-            # Convertir a base64 para enviar al frontend
-            buffered = BytesIO()
-            processed_image.save(buffered, format="PNG")
-            img_base64 = base64.b64encode(buffered.getvalue()).decode()
-
-            return jsonify({
-                'success': True,
-                'image': f'data:image/png;base64,{img_base64}',
-                'report': report
-            })
-
-        finally:
-            # Limpiar archivo temporal
-            os.unlink(temp_path)
+        # Leer imagen directamente del stream subido (sin escribir a disco)
+        image = Image.open(file.stream)
+        width, height = image.size
+        if width * height > MAX_IMAGE_PIXELS:
+            # Rechazar antes de decodificar los píxeles
+            return jsonify({'error': f'Imagen demasiado grande: {width}x{height} '
+                                     f'(máximo {MAX_IMAGE_PIXELS:,} píxeles)'}), 413
+        image.load()
+        image_array = np.array(image)
+
+        # Procesar imagen
+        processed_array, report = process_image_for_gradio(
+            image_array,
+            enhancement_type=enhancement_type,
+            enhancement_method=enhancement_method,
+            scale_factor=scale_factor
+        )
+
+        # Convertir a PIL Image
+        processed_image = Image.fromarray(processed_array)
+
+        # Guardar el PNG y devolver su URL (sin base64 dentro del JSON)
+        buffered = BytesIO()
+        processed_image.save(buffered, format="PNG")
+        image_url = f'/process/result/{store_result(buffered.getvalue())}'
+
+        return jsonify({
+            'success': True,
+            'image': image_url,
+            'image_url': image_url,
+            'report': report
+        })
 
     except Exception as e:
         return jsonify({'error': f'Error procesando imagen: {str(e)}'}), 500
 
+@app.route('/process/result/<result_id>')
+def process_result(result_id):
+    """Devuelve la imagen procesada como PNG."""
+    path = result_path(result_id)
+    # Solo identificadores uuid4 en hex: evita rutas arbitrarias
+    if len(result_id) != 32 or not all(c in '0123456789abcdef' for c in result_id) \
+            or not os.path.exists(path):
+        return jsonify({'error': 'Resultado no encontrado o expirado'}), 404
+    return send_file(os.path.abspath(path), mimetype='image/png', download_name='resultado.png')
+
 @app.route('/health')
 def health():
     """Endpoint de salud para verificar que la app funciona."""
@@ -5,57 +5,85 @@ Crea imágenes HR/LR artificiales y las sube automáticamente.
 
 import os
 import numpy as np
-from PIL import Image, ImageDraw
+import cv2
+from PIL import Image
 import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import importlib.util
+
+# Subidas paralelas por fragmentos (Rust) si hf_transfer está instalado; debe
+# activarse antes de importar huggingface_hub, que lee la variable al importarse
+if importlib.util.find_spec('hf_transfer') is not None:
+    os.environ.setdefault('HF_HUB_ENABLE_HF_TRANSFER', '1')
+
 from huggingface_hub import HfApi, create_repo
 from pathlib import Path
 from typing import Optional
 
 
-def generate_artificial_image(size=(512, 512), pattern_type='random'):
+def generate_artificial_array(size=(512, 512), pattern_type='random', out=None):
     """
-    Genera una imagen artificial de ejemplo para dataset de SR.
+    Genera el patrón artificial directamente como array RGB uint8.
 
     Args:
         size: Tupla (width, height)
         pattern_type: Tipo de patrón ('random', 'gradient', 'checkerboard', 'solid')
+        out: Array (height, width, 3) opcional donde escribir el resultado
 
     Returns:
-        PIL Image
+        Array numpy (height, width, 3) uint8
     """
+    if out is None:
+        out = np.empty((size[1], size[0], 3), dtype=np.uint8)
+
     if pattern_type == 'random':
         # Imagen con colores aleatorios
-        img_array = np.random.randint(0, 256, (size[1], size[0], 3), dtype=np.uint8)
-        img = Image.fromarray(img_array)
+        out[...] = np.random.randint(0, 256, out.shape, dtype=np.uint8)
     elif pattern_type == 'gradient':
-        # Gradiente simple
-        img = Image.new('RGB', size, color=(255, 255, 255))
-        draw = ImageDraw.Draw(img)
-        for y in range(size[1]):
-            r = int(255 * (y / size[1]))
-            g = int(255 * (1 - y / size[1]))
-            b = 128
-            draw.line([(0, y), (size[0], y)], fill=(r, g, b))
+        # Gradiente simple: rampa vertical calculada una vez y difundida a todas las columnas
+        t = np.arange(size[1]) / size[1]
+        out[:, :, 0] = (255 * t).astype(np.uint8)[:, None]
+        out[:, :, 1] = (255 * (1 - t)).astype(np.uint8)[:, None]
+        out[:, :, 2] = 128
     elif pattern_type == 'checkerboard':
-        # Patrón de ajedrez
-        img = Image.new('RGB', size, color=(255, 255, 255))
-        draw = ImageDraw.Draw(img)
+        # Patrón de ajedrez vectorizado (los rectángulos de ImageDraw incluyen el borde,
+        # por eso las líneas de separación entre casillas quedan en negro)
         square_size = 32
-        for x in range(0, size[0], square_size):
-            for y in range(0, size[1], square_size):
-                if (x // square_size + y // square_size) % 2 == 0:
-                    draw.rectangle([x, y, x+square_size, y+square_size], fill=(0, 0, 0))
+        x = np.arange(size[0])
+        y = np.arange(size[1])[:, None]
+        black = ((x // square_size + y // square_size) % 2 == 0)
+        black |= (x % square_size == 0) & (x > 0)
+        black |= (y % square_size == 0) & (y > 0)
+        out[...] = 255
+        out[black] = 0
     else:
         # Color sólido aleatorio
-        color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
-        img = Image.new('RGB', size, color=color)
+        out[...] = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
+
+    return out
+
+
+def generate_artificial_image(size=(512, 512), pattern_type='random'):
+    """
+    Genera una imagen artificial de ejemplo para dataset de SR.
+
+    Args:
+        size: Tupla (width, height)
+        pattern_type: Tipo de patrón ('random', 'gradient', 'checkerboard', 'solid')
 
-    return img
+    Returns:
+        PIL Image
+    """
+    return Image.fromarray(generate_artificial_array(size, pattern_type))
 
 
 def downscale_bicubic(img: Image.Image, scale_factor: int = 2) -> Image.Image:
     """
-    Reduce la resolución usando interpolación bicubic.
+    Reduce la resolución de la imagen por un factor entero.
+
+    Usa cv2.INTER_AREA (promediado por área, vectorizado en OpenCV), que es
+    el filtro adecuado para reducir y bastante más rápido que el bicubic de PIL.
 
     Args:
         img: Imagen PIL
@@ -66,52 +94,113 @@ def downscale_bicubic(img: Image.Image, scale_factor: int = 2) -> Image.Image:
     """
     w, h = img.size
     new_w, new_h = w // scale_factor, h // scale_factor
-    return img.resize((new_w, new_h), Image.BICUBIC)
+    arr = np.asarray(img.convert('RGB'))
+    return Image.fromarray(cv2.resize(arr, (new_w, new_h), interpolation=cv2.INTER_AREA))
 
 
-def create_dataset_structure(base_dir='dataset', num_images=50):
+# Parámetros de escritura por formato (WebP con calidad > 100 = modo sin pérdidas)
+IMAGE_WRITE_PARAMS = {
+    'png': [],
+    'webp': [int(cv2.IMWRITE_WEBP_QUALITY), 101],
+}
+
+
+def _generate_chunk(indices, chosen, base_dir, seed, fmt='png'):
     """
-    Crea la estructura del dataset con imágenes HR y LR.
+    Genera y guarda un bloque de pares HR/LR (se ejecuta en un proceso del pool).
 
     Args:
+        indices: Índices globales de las imágenes del bloque
+        chosen: Patrón de cada imagen del bloque
         base_dir: Directorio base
-        num_images: Número de pares HR/LR a generar
+        seed: Semilla base; cada bloque usa seed + primer índice
+        fmt: Formato de salida ('png' o 'webp' sin pérdidas)
 
     Returns:
-        Path al directorio creado
+        Número de pares generados
     """
     hr_dir = Path(base_dir) / 'train' / 'HR'
     lr_dir = Path(base_dir) / 'train' / 'LR'
+    write_params = IMAGE_WRITE_PARAMS[fmt]
 
-    hr_dir.mkdir(parents=True, exist_ok=True)
-    lr_dir.mkdir(parents=True, exist_ok=True)
-
-    patterns = ['random', 'gradient', 'checkerboard', 'solid']
-
-    print(f"🎨 Generando {num_images} pares HR/LR artificiales...")
+    # Semillas independientes por bloque (los procesos hijos heredan el mismo estado)
+    cv2.setRNGSeed(seed + indices[0])
+    random.seed(seed + indices[0])
 
-    for i in range(num_images):
-        # Elegir patrón aleatorio
-        pattern = random.choice(patterns)
+    # Generar el bloque HR como un único tensor (n, 512, 512, 3)
+    hr_batch = np.empty((len(indices), 512, 512, 3), dtype=np.uint8)
+    for k, pattern in enumerate(chosen):
+        if pattern == 'random':
+            # Ruido uniforme generado por OpenCV directamente sobre el slice (sin temporal ni copia)
+            cv2.randu(hr_batch[k], (0, 0, 0), (256, 256, 256))
+        else:
+            generate_artificial_array(size=(512, 512), pattern_type=pattern, out=hr_batch[k])
 
-        # Generar imagen HR
-        hr_img = generate_artificial_image(size=(512, 512), pattern_type=pattern)
+    for k, i in enumerate(indices):
+        hr_array = hr_batch[k]
 
-        # Generar LR downscaled x2
-        lr_img = downscale_bicubic(hr_img, scale_factor=2)
+        # Generar LR downscaled x2 directamente sobre el array
+        lr_array = cv2.resize(hr_array, (256, 256), interpolation=cv2.INTER_AREA)
 
         # Nombres de archivo consistentes
-        filename = "04d"
+        filename = f"{i:04d}.{fmt}"
 
-        # Guardar imágenes
+        # Guardar imágenes (OpenCV espera BGR)
         hr_path = hr_dir / filename
         lr_path = lr_dir / filename
 
-        hr_img.save(hr_path)
-        lr_img.save(lr_path)
+        cv2.imwrite(str(hr_path), cv2.cvtColor(hr_array, cv2.COLOR_RGB2BGR), write_params)
+        cv2.imwrite(str(lr_path), cv2.cvtColor(lr_array, cv2.COLOR_RGB2BGR), write_params)
+
+    return len(indices)
 
-        if (i + 1) % 10 == 0:
-            print(f"✅ Generadas {i+1}/{num_images} imágenes")
+
+def create_dataset_structure(base_dir='dataset', num_images=50, num_workers=None, seed=None, fmt='png'):
+    """
+    Crea la estructura del dataset con imágenes HR y LR.
+
+    Args:
+        base_dir: Directorio base
+        num_images: Número de pares HR/LR a generar
+        num_workers: Procesos para la generación (por defecto os.cpu_count())
+        seed: Semilla para reproducibilidad (aleatoria si es None)
+        fmt: Formato de las imágenes ('png' o 'webp' sin pérdidas; WebP ocupa
+            mucho menos en patrones sólidos/gradientes pero codifica más lento)
+
+    Returns:
+        Path al directorio creado
+    """
+    hr_dir = Path(base_dir) / 'train' / 'HR'
+    lr_dir = Path(base_dir) / 'train' / 'LR'
+
+    hr_dir.mkdir(parents=True, exist_ok=True)
+    lr_dir.mkdir(parents=True, exist_ok=True)
+
+    patterns = ['random', 'gradient', 'checkerboard', 'solid']
+    if fmt not in IMAGE_WRITE_PARAMS:
+        raise ValueError(f"Formato no soportado: {fmt}")
+
+    print(f"🎨 Generando {num_images} pares HR/LR artificiales...")
+
+    if seed is None:
+        seed = random.randrange(2**32)
+    # Secuencia completa de patrones en una sola llamada vectorizada
+    chosen = np.random.default_rng(seed).choice(patterns, size=num_images).tolist()
+
+    # Repartir las imágenes en bloques independientes entre procesos
+    chunk_size = 8
+    starts = range(0, num_images, chunk_size)
+    index_chunks = [list(range(start, min(start + chunk_size, num_images))) for start in starts]
+    pattern_chunks = [chosen[start:start + chunk_size] for start in starts]
+
+    done = 0
+    with ProcessPoolExecutor(max_workers=num_workers or os.cpu_count()) as executor:
+        for count in executor.map(_generate_chunk, index_chunks, pattern_chunks,
+                                  repeat(base_dir), repeat(seed), repeat(fmt)):
+            previous = done
+            done += count
+            if done // 10 > previous // 10:
+                print(f"✅ Generadas {done}/{num_images} imágenes")
 
     print("✅ Dataset generado localmente!")
     return base_dir
@@ -277,7 +366,8 @@ def upload_to_huggingface(
             folder_path=base_dir,
             repo_id=repo_name,
             repo_type="dataset",
-            commit_message="Subida inicial del dataset de super-resolución"
+            commit_message="Subida inicial del dataset de super-resolución",
+            ignore_patterns=["*.tmp", ".DS_Store"]
         )
 
         print("✅ Dataset subido exitosamente a Hugging Face Hub!")
@@ -290,6 +380,23 @@ def upload_to_huggingface(
         return False
 
 
+def _image_stems(directory) -> list:
+    """
+    Devuelve los nombres (sin extensión) de las imágenes de un directorio.
+
+    Una sola pasada con os.scandir en lugar de un glob por extensión.
+
+    Args:
+        directory: Directorio a recorrer
+
+    Returns:
+        Lista de nombres sin extensión
+    """
+    with os.scandir(directory) as entries:
+        return [os.path.splitext(entry.name)[0] for entry in entries
+                if entry.name.lower().endswith(('.png', '.jpg', '.webp'))]
+
+
 def validate_dataset(base_dir='dataset') -> bool:
     """
     Valida que el dataset esté correctamente estructurado.
@@ -312,8 +419,8 @@ def validate_dataset(base_dir='dataset') -> bool:
         print(f"❌ Directorio LR no existe: {lr_dir}")
         return False
 
-    hr_files = list(hr_dir.glob("*.png")) + list(hr_dir.glob("*.jpg"))
-    lr_files = list(lr_dir.glob("*.png")) + list(lr_dir.glob("*.jpg"))
+    hr_files = _image_stems(hr_dir)
+    lr_files = _image_stems(lr_dir)
 
     if len(hr_files) == 0:
         print("❌ No hay imágenes HR")
@@ -328,10 +435,7 @@ def validate_dataset(base_dir='dataset') -> bool:
         return False
 
     # Verificar pares
-    hr_names = {f.stem for f in hr_files}
-    lr_names = {f.stem for f in lr_files}
-
-    if hr_names != lr_names:
+    if set(hr_files) != set(lr_files):
         print("❌ Nombres de archivos no coinciden entre HR y LR")
         return False
 
@@ -347,6 +451,8 @@ if __name__ == "__main__":
                        help='Número de imágenes a generar (default: 50)')
     parser.add_argument('--repo_name', type=str, default='AnaLujan/restauracion-superres',
                        help='Nombre del repo en HF (default: AnaLujan/restauracion-superres)')
+    parser.add_argument('--format', type=str, default='png', choices=['png', 'webp'],
+                       help='Formato de las imágenes (default: png; webp es sin pérdidas)')
     parser.add_argument('--upload', action='store_true',
                        help='Subir a Hugging Face')
     parser.add_argument('--token', type=str, default=None,
@@ -355,7 +461,7 @@ if __name__ == "__main__":
     args = parser.parse_args()
 
     # Generar dataset
-    dataset_dir = create_dataset_structure(num_images=args.num_images)
+    dataset_dir = create_dataset_structure(num_images=args.num_images, fmt=args.format)
     create_dataset_info_json(dataset_dir, args.repo_name)
     create_readme(dataset_dir, args.repo_name)
 
@@ -8,18 +8,137 @@ from torch.utils.data import Dataset
 import torchvision.transforms as transforms
 from PIL import Image
 import numpy as np
+import cv2
 import os
 from pathlib import Path
 from typing import Tuple, Optional, List
 
 
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.webp')
+
+
+def list_image_files(directory) -> List[Path]:
+    """
+    Lista las imágenes de un directorio ordenadas por nombre.
+
+    Usa os.scandir (sin stat adicional por entrada) y una única ordenación,
+    de modo que HR y LR quedan alineados por nombre independientemente de la extensión.
+
+    Args:
+        directory: Directorio a listar
+
+    Returns:
+        Lista ordenada de rutas
+    """
+    with os.scandir(directory) as entries:
+        paths = [entry.path for entry in entries
+                 if entry.name.lower().endswith(IMAGE_EXTENSIONS) and entry.is_file()]
+    return [Path(p) for p in sorted(paths)]
+
+
+def load_rgb(path) -> np.ndarray:
+    """
+    Decodifica una imagen a un array RGB uint8 con OpenCV.
+
+    Args:
+        path: Ruta de la imagen
+
+    Returns:
+        Array numpy (H, W, 3) uint8
+    """
+    with open(path, 'rb') as f:
+        buffer = np.frombuffer(f.read(), np.uint8)
+    image = cv2.imdecode(buffer, cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        # Formato no soportado por OpenCV: recurrir a PIL
+        return np.array(Image.open(path).convert('RGB'))
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+class FusedNormalize:
+    """
+    Equivalente a ToTensor + Normalize(mean=0.5, std=0.5) en una sola conversión.
+
+    Convierte una imagen uint8 HWC (PIL o ndarray) a tensor float32 CHW en
+    [-1, 1] como x / 127.5 - 1, sin los tensores intermedios de ToTensor.
+    """
+
+    def __call__(self, pic) -> torch.Tensor:
+        array = pic if isinstance(pic, np.ndarray) else np.array(pic)
+        if array.ndim == 2:
+            array = array[:, :, None]
+        return self.from_chw(array.transpose(2, 0, 1))
+
+    @staticmethod
+    def from_chw(array: np.ndarray) -> torch.Tensor:
+        """
+        Normaliza un array uint8 que ya está en disposición CHW (planar).
+
+        Args:
+            array: Array (C, H, W) uint8
+
+        Returns:
+            Tensor float32 (C, H, W) contiguo en [-1, 1]
+        """
+        if not array.flags.writeable:
+            # Vistas de solo lectura (memory-map): materializar la muestra
+            array = np.array(array)
+        tensor = torch.from_numpy(array)
+        return tensor.to(torch.float32, memory_format=torch.contiguous_format).mul_(1.0 / 127.5).sub_(1.0)
+
+
+class ToUint8Tensor:
+    """
+    Convierte una imagen uint8 HWC a tensor uint8 CHW sin normalizar.
+
+    Mantiene las muestras en 1 byte por canal a lo largo del DataLoader y de la
+    transferencia al dispositivo; la normalización se hace allí con dequantize().
+    """
+
+    def __call__(self, pic) -> torch.Tensor:
+        array = pic if isinstance(pic, np.ndarray) else np.array(pic)
+        if array.ndim == 2:
+            array = array[:, :, None]
+        return self.from_chw(array.transpose(2, 0, 1))
+
+    @staticmethod
+    def from_chw(array: np.ndarray) -> torch.Tensor:
+        """
+        Copia un array uint8 en disposición CHW a un tensor contiguo.
+
+        Args:
+            array: Array (C, H, W) uint8
+
+        Returns:
+            Tensor uint8 (C, H, W)
+        """
+        return torch.from_numpy(np.array(array))
+
+
+def dequantize(x: torch.Tensor, dtype: torch.dtype = torch.float32) -> torch.Tensor:
+    """
+    Normaliza un tensor uint8 (p.ej. un batch ya en GPU) a [-1, 1].
+
+    Equivale a ToTensor + Normalize(0.5, 0.5) aplicado después de la transferencia.
+
+    Args:
+        x: Tensor uint8
+        dtype: Tipo de salida (float32 o float16)
+
+    Returns:
+        Tensor normalizado
+    """
+    return x.to(dtype).mul_(1.0 / 127.5).sub_(1.0)
+
+
 class SuperResolutionDataset(Dataset):
     """
     Dataset personalizado para super-resolución con pares HR/LR.
     """
 
     def __init__(self, hr_dir: str, lr_dir: str, scale_factor: int = 2,
-                 transform: Optional[transforms.Compose] = None):
+                 transform: Optional[transforms.Compose] = None,
+                 cache_in_memory: bool = False, cache_path: Optional[str] = None):
         """
         Inicializa el dataset.
 
@@ -28,37 +147,106 @@ class SuperResolutionDataset(Dataset):
             lr_dir: Directorio con imágenes LR
             scale_factor: Factor de escala
             transform: Transformaciones a aplicar
+            cache_in_memory: Decodificar todas las imágenes una sola vez y
+                mantenerlas en memoria como uint8 (evita reabrir PNGs cada época)
+            cache_path: Prefijo de los ficheros .npy creados con build_cache;
+                si existen se leen con memory-map en lugar de abrir cada imagen
         """
         self.hr_dir = Path(hr_dir)
         self.lr_dir = Path(lr_dir)
         self.scale_factor = scale_factor
 
-        # Obtener lista de archivos
-        self.hr_files = sorted(list(self.hr_dir.glob("*.png"))) + sorted(list(self.hr_dir.glob("*.jpg")))
-        self.lr_files = sorted(list(self.lr_dir.glob("*.png"))) + sorted(list(self.lr_dir.glob("*.jpg")))
+        # Obtener lista de archivos (una sola pasada y una sola ordenación por directorio)
+        self.hr_files = list_image_files(self.hr_dir)
+        self.lr_files = list_image_files(self.lr_dir)
 
         # Verificar que coincidan
         assert len(self.hr_files) == len(self.lr_files), "Número diferente de archivos HR/LR"
 
         # Transformaciones por defecto
         if transform is None:
-            self.transform = transforms.Compose([
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-            ])
+            self.transform = FusedNormalize()
         else:
             self.transform = transform
 
+        # Cache opcional de imágenes decodificadas (uint8 HWC)
+        self._hr_cache = None
+        self._lr_cache = None
+        self._cache_chw = False
+        if cache_path is not None and os.path.exists(cache_path + '_hr.npy'):
+            # Los ficheros de build_cache están en disposición planar (N, C, H, W)
+            self._cache_chw = True
+            self._hr_cache = np.load(cache_path + '_hr.npy', mmap_mode='r')
+            self._lr_cache = np.load(cache_path + '_lr.npy', mmap_mode='r')
+        elif cache_in_memory:
+            self._hr_cache = [load_rgb(p) for p in self.hr_files]
+            self._lr_cache = [load_rgb(p) for p in self.lr_files]
+
+    @staticmethod
+    def build_cache(hr_dir: str, lr_dir: str, cache_path: str) -> Tuple[str, str]:
+        """
+        Empaqueta todos los pares HR/LR decodificados en dos ficheros .npy contiguos.
+
+        Con el cache creado, cada muestra es una lectura de un memory-map en
+        lugar de abrir y decodificar dos ficheros por época. Las imágenes se
+        guardan en disposición planar (N, C, H, W), la que consume el modelo,
+        para no permutar canales en cada muestra.
+
+        Args:
+            hr_dir: Directorio con imágenes HR
+            lr_dir: Directorio con imágenes LR
+            cache_path: Prefijo de salida (se crean <prefijo>_hr.npy y <prefijo>_lr.npy)
+
+        Returns:
+            Tupla con las rutas de los ficheros HR y LR
+        """
+        hr_files = list_image_files(hr_dir)
+        lr_files = list_image_files(lr_dir)
+        if not hr_files or len(hr_files) != len(lr_files):
+            raise ValueError("Se necesitan pares HR/LR no vacíos para construir el cache")
+
+        paths = []
+        for files, suffix in ((hr_files, '_hr.npy'), (lr_files, '_lr.npy')):
+            first = load_rgb(files[0])
+            out = np.lib.format.open_memmap(cache_path + suffix, mode='w+', dtype=np.uint8,
+                                            shape=(len(files), first.shape[2]) + first.shape[:2])
+            out[0] = first.transpose(2, 0, 1)
+            for i, path in enumerate(files[1:], start=1):
+                image = load_rgb(path)
+                if image.shape != first.shape:
+                    raise ValueError(f"Tamaño inconsistente en {path}: {image.shape} != {first.shape}")
+                out[i] = image.transpose(2, 0, 1)
+            out.flush()
+            del out
+            paths.append(cache_path + suffix)
+        return tuple(paths)
+
     def __len__(self) -> int:
+        if self._hr_cache is not None:
+            return len(self._hr_cache)
         return len(self.hr_files)
 
     def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        # Cargar imágenes
-        hr_path = self.hr_files[idx]
-        lr_path = self.lr_files[idx]
+        if self._cache_chw:
+            hr_planar = self._hr_cache[idx]
+            lr_planar = self._lr_cache[idx]
+            if hasattr(self.transform, 'from_chw'):
+                # Ya en CHW: convertir sin permutar
+                return self.transform.from_chw(lr_planar), self.transform.from_chw(hr_planar)
+            hr_image = np.ascontiguousarray(hr_planar.transpose(1, 2, 0))
+            lr_image = np.ascontiguousarray(lr_planar.transpose(1, 2, 0))
+        elif self._hr_cache is not None:
+            hr_image = self._hr_cache[idx]
+            lr_image = self._lr_cache[idx]
+        else:
+            # Cargar imágenes
+            hr_image = load_rgb(self.hr_files[idx])
+            lr_image = load_rgb(self.lr_files[idx])
 
-        hr_image = Image.open(hr_path).convert('RGB')
-        lr_image = Image.open(lr_path).convert('RGB')
+        if not hasattr(self.transform, 'from_chw'):
+            # Las transformaciones de torchvision (augmentation) esperan PIL
+            hr_image = Image.fromarray(hr_image)
+            lr_image = Image.fromarray(lr_image)
 
         # Aplicar transformaciones
         if self.transform:
@@ -90,10 +278,7 @@ class HFDatasetAdapter(Dataset):
         self.scale_factor = scale_factor
 
         if transform is None:
-            self.transform = transforms.Compose([
-                transforms.ToTensor(),
-                transforms.Normalize(mean=[0.5, 0.5, 0.5], std=[0.5, 0.5, 0.5])
-            ])
+            self.transform = FusedNormalize()
         else:
             self.transform = transform
 
@@ -187,13 +372,16 @@ def create_synthetic_dataset(num_samples: int = 100, output_dir: str = 'syntheti
 
     patterns = ['random', 'gradient', 'checkerboard', 'solid']
 
+    patterns_seq = np.random.choice(patterns, size=num_samples)
+
     for i in range(num_samples):
-        pattern = np.random.choice(patterns)
+        pattern = patterns_seq[i]
         hr_img = generate_artificial_image(size=image_size, pattern_type=pattern)
         lr_img = downscale_bicubic(hr_img, scale_factor=scale_factor)
 
-        hr_path = hr_dir / "04d"
-        lr_path = lr_dir / "04d"
+        filename = f"{i:04d}.png"
+        hr_path = hr_dir / filename
+        lr_path = lr_dir / filename
 
         hr_img.save(hr_path)
         lr_img.save(lr_path)
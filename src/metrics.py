@@ -3,16 +3,26 @@ Métricas de entrenamiento usando TorchMetrics.
 PSNR, SSIM y otras métricas para evaluación durante el entrenamiento.
 """
 
+import atexit
+import sys
 import torch
 import torch.nn as nn
-from torchmetrics import PeakSignalNoiseRatio, StructuralSimilarityIndexMeasure
-from torchmetrics.image import LearnedPerceptualImagePatchSimilarity
 from typing import Dict, Any, Optional
 
+# Objetos SRMetrics reutilizados entre evaluaciones, por dispositivo
+_metrics_cache: Dict[str, 'SRMetrics'] = {}
+
+# Handles de archivos de log abiertos, por path
+_log_handles: Dict[str, Any] = {}
+
 
 class SRMetrics:
     """
     Métricas especializadas para super-resolución.
+
+    Espera tensores normalizados a [-1, 1] (como los del dataset); la predicción
+    se recorta a ese rango, PSNR y SSIM se calculan sobre [0, 1] y LPIPS
+    directamente sobre [-1, 1].
     """
 
     def __init__(self, device: str = 'cpu'):
@@ -24,43 +34,80 @@ class SRMetrics:
         """
         self.device = device
 
+        # Import lazy: torchmetrics tarda segundos en importarse
+        from torchmetrics import PeakSignalNoiseRatio, StructuralSimilarityIndexMeasure
+
         # Métricas principales
         self.psnr = PeakSignalNoiseRatio(data_range=1.0).to(device)
         self.ssim = StructuralSimilarityIndexMeasure(data_range=1.0).to(device)
 
         # LPIPS (opcional, requiere instalación)
         try:
+            from torchmetrics.image import LearnedPerceptualImagePatchSimilarity
             self.lpips = LearnedPerceptualImagePatchSimilarity(net_type='vgg').to(device)
             self.has_lpips = True
         except:
             self.has_lpips = False
             print("LPIPS no disponible, omitiendo métrica perceptual")
 
-    def __call__(self, lr_batch: torch.Tensor, hr_batch: torch.Tensor) -> Dict[str, torch.Tensor]:
+    def __call__(self, pred: torch.Tensor, target: torch.Tensor) -> Dict[str, torch.Tensor]:
         """
-        Calcula todas las métricas.
+        Calcula todas las métricas del batch (y las acumula).
 
         Args:
-            lr_batch: Batch de imágenes LR
-            hr_batch: Batch de imágenes HR
+            pred: Batch de imágenes predichas (SR)
+            target: Batch de imágenes de referencia (HR)
 
         Returns:
-            Dict con métricas
+            Dict con métricas del batch
         """
         metrics = {}
+        # Las salidas del modelo no están acotadas: recortar al rango válido de las métricas
+        pred = pred.clamp(-1.0, 1.0)
+        pred_unit, target_unit = _to_unit_range(pred), _to_unit_range(target)
 
         # PSNR
-        metrics['psnr'] = self.psnr(hr_batch, hr_batch)  # Comparar HR con HR para baseline
+        metrics['psnr'] = self.psnr(pred_unit, target_unit)
 
         # SSIM
-        metrics['ssim'] = self.ssim(hr_batch, hr_batch)
+        metrics['ssim'] = self.ssim(pred_unit, target_unit)
 
         # LPIPS si disponible
         if self.has_lpips:
-            metrics['lpips'] = self.lpips(hr_batch, hr_batch)
+            metrics['lpips'] = self.lpips(pred, target)
 
         return metrics
 
+    def update(self, pred: torch.Tensor, target: torch.Tensor):
+        """
+        Acumula el estado de las métricas sin sincronizar con el dispositivo.
+
+        Args:
+            pred: Batch de imágenes predichas (SR)
+            target: Batch de imágenes de referencia (HR)
+        """
+        pred = pred.clamp(-1.0, 1.0)
+        pred_unit, target_unit = _to_unit_range(pred), _to_unit_range(target)
+        self.psnr.update(pred_unit, target_unit)
+        self.ssim.update(pred_unit, target_unit)
+        if self.has_lpips:
+            self.lpips.update(pred, target)
+
+    def compute(self) -> Dict[str, float]:
+        """
+        Calcula las métricas acumuladas (una sola sincronización).
+
+        Returns:
+            Dict con métricas promedio
+        """
+        results = {
+            'psnr': self.psnr.compute().item(),
+            'ssim': self.ssim.compute().item()
+        }
+        if self.has_lpips:
+            results['lpips'] = self.lpips.compute().item()
+        return results
+
     def reset(self):
         """Resetea las métricas para nueva evaluación."""
         self.psnr.reset()
@@ -69,6 +116,11 @@ class SRMetrics:
             self.lpips.reset()
 
 
+def _to_unit_range(x: torch.Tensor) -> torch.Tensor:
+    """Mapea un tensor de [-1, 1] a [0, 1] (rango de data_range=1.0)."""
+    return x.add(1.0).mul_(0.5)
+
+
 def log_training_metrics(epoch: int, train_loss: float, val_loss: float,
                         train_metrics: Dict[str, float], val_metrics: Dict[str, float],
                         log_file: Optional[str] = None):
@@ -83,72 +135,96 @@ def log_training_metrics(epoch: int, train_loss: float, val_loss: float,
         val_metrics: Métricas de validación
         log_file: Archivo para logging (opcional)
     """
-    print(f"\n📈 Epoch {epoch} Metrics:")
-    print(f"   Train Loss: {train_loss:.4f}")
-    print(f"   Val Loss:   {val_loss:.4f}")
+    lines = [
+        f"\n📈 Epoch {epoch} Metrics:",
+        f"   Train Loss: {train_loss:.4f}",
+        f"   Val Loss:   {val_loss:.4f}"
+    ]
 
     for metric_name in train_metrics.keys():
         if metric_name in val_metrics:
-            train_val = train_metrics[metric_name]
-            val_val = val_metrics[metric_name]
-            print(f"   Train {metric_name.upper()}: {train_val:.4f}")
-            print(f"   Val {metric_name.upper()}:   {val_val:.4f}")
+            lines.append(f"   Train {metric_name.upper()}: {train_metrics[metric_name]:.4f}")
+            lines.append(f"   Val {metric_name.upper()}:   {val_metrics[metric_name]:.4f}")
+
+    # Una sola escritura a stdout
+    sys.stdout.write("\n".join(lines) + "\n")
 
-    # Logging a archivo
+    # Logging a archivo (handle abierto una vez por archivo)
     if log_file:
-        with open(log_file, 'a') as f:
-            f.write(f"{epoch},{train_loss:.4f},{val_loss:.4f}")
-            for metric_name in sorted(train_metrics.keys()):
-                if metric_name in val_metrics:
-                    f.write(f",{train_metrics[metric_name]:.4f},{val_metrics[metric_name]:.4f}")
-            f.write("\n")
+        row = f"{epoch},{train_loss:.4f},{val_loss:.4f}" + "".join(
+            f",{train_metrics[name]:.4f},{val_metrics[name]:.4f}"
+            for name in sorted(train_metrics.keys()) if name in val_metrics
+        )
+        f = _get_log_handle(log_file)
+        f.write(row + "\n")
+        f.flush()
+
+
+def _get_log_handle(log_file: str):
+    """
+    Obtiene el handle de un archivo de log, abriéndolo solo la primera vez.
+
+    Args:
+        log_file: Path del archivo de log
+
+    Returns:
+        Handle abierto en modo append
+    """
+    f = _log_handles.get(log_file)
+    if f is None or f.closed:
+        f = _log_handles[log_file] = open(log_file, 'a')
+    return f
+
+
+def _close_log_handles():
+    """Cierra los handles de log abiertos (registrado con atexit)."""
+    for f in _log_handles.values():
+        f.close()
+    _log_handles.clear()
+
+
+atexit.register(_close_log_handles)
 
 
 def evaluate_model(model: nn.Module, val_loader: torch.utils.data.DataLoader,
-                  device: str = 'cpu') -> Dict[str, float]:
+                  device: Optional[str] = None) -> Dict[str, float]:
     """
     Evalúa el modelo en el conjunto de validación.
 
     Args:
         model: Modelo a evaluar
         val_loader: DataLoader de validación
-        device: Dispositivo
+        device: Dispositivo (por defecto, el de los parámetros del modelo)
 
     Returns:
         Dict con métricas promedio
     """
+    if device is None:
+        device = next(model.parameters()).device
+    device = torch.device(device)
+    if device.type == 'cuda':
+        # Shapes fijos en validación: cuDNN elige el mejor algoritmo una vez
+        torch.backends.cudnn.benchmark = True
+
     model.eval()
-    metrics = SRMetrics(device=device)
+    key = str(device)
+    if key not in _metrics_cache:
+        _metrics_cache[key] = SRMetrics(device=device)
+    metrics = _metrics_cache[key]
     metrics.reset()
 
-    total_metrics = {'psnr': 0.0, 'ssim': 0.0}
-    if metrics.has_lpips:
-        total_metrics['lpips'] = 0.0
-
-    num_batches = 0
-
-    with torch.no_grad():
+    with torch.inference_mode():
         for lr_batch, hr_batch in val_loader:
-            lr_batch = lr_batch.to(device)
-            hr_batch = hr_batch.to(device)
+            lr_batch = lr_batch.to(device, non_blocking=True)
+            hr_batch = hr_batch.to(device, non_blocking=True)
 
             # Forward pass
             outputs = model(lr_batch)
 
-            # Calcular métricas
-            batch_metrics = metrics(lr_batch, hr_batch)
-
-            for key in total_metrics:
-                if key in batch_metrics:
-                    total_metrics[key] += batch_metrics[key].item()
-
-            num_batches += 1
-
-    # Promedios
-    for key in total_metrics:
-        total_metrics[key] /= num_batches
+            # Acumular métricas (sin .item() por batch)
+            metrics.update(outputs, hr_batch)
 
-    return total_metrics
+    return metrics.compute()
 
 
 def create_metrics_header() -> str:
@@ -174,14 +250,14 @@ def save_metrics_to_csv(metrics_log: list, filepath: str):
     if not metrics_log:
         return
 
-    fieldnames = ['epoch', 'train_loss', 'val_loss'] + \
-                [f'train_{k}' for k in metrics_log[0].keys() if k not in ['epoch', 'train_loss', 'val_loss']] + \
-                [f'val_{k}' for k in metrics_log[0].keys() if k not in ['epoch', 'train_loss', 'val_loss']]
+    # Columnas en el orden del primer registro (ya incluyen prefijos train_/val_)
+    fieldnames = list(metrics_log[0].keys())
+    rows = [[entry.get(key, '') for key in fieldnames] for entry in metrics_log]
 
-    with open(filepath, 'w', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(metrics_log)
+    with open(filepath, 'w', newline='', buffering=1 << 20) as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(fieldnames)
+        writer.writerows(rows)
 
     print(f"Métricas guardadas en: {filepath}")
 
@@ -17,20 +17,26 @@ class SRCNN(nn.Module):
     Arquitectura clásica de 3 capas convolucionales.
     """
 
-    def __init__(self, scale_factor: int = 2):
+    def __init__(self, scale_factor: int = 2, upsampling: str = 'bilinear'):
         """
         Inicializa SRCNN.
 
         Args:
             scale_factor: Factor de escala (2 o 4)
+            upsampling: 'bilinear' (interpolación previa, SRCNN clásico) o
+                'pixelshuffle' (convs en resolución LR + PixelShuffle, estilo ESPCN)
         """
         super(SRCNN, self).__init__()
         self.scale_factor = scale_factor
+        self.upsampling = upsampling
+
+        # Con PixelShuffle la última capa produce 3*s^2 canales en LR
+        out_channels = 3 * scale_factor ** 2 if upsampling == 'pixelshuffle' else 3
 
         # Capas convolucionales
         self.conv1 = nn.Conv2d(3, 64, kernel_size=9, padding=4)
         self.conv2 = nn.Conv2d(64, 32, kernel_size=1, padding=0)
-        self.conv3 = nn.Conv2d(32, 3, kernel_size=5, padding=2)
+        self.conv3 = nn.Conv2d(32, out_channels, kernel_size=5, padding=2)
 
         # Inicialización de pesos
         self._initialize_weights()
@@ -54,7 +60,8 @@ class SRCNN(nn.Module):
             Output HR tensor (B, 3, H*scale, W*scale)
         """
         # Upscaling inicial con bilinear
-        x = F.interpolate(x, scale_factor=self.scale_factor, mode='bilinear', align_corners=False)
+        if self.upsampling != 'pixelshuffle':
+            x = F.interpolate(x, scale_factor=self.scale_factor, mode='bilinear', align_corners=False)
 
         # Feature extraction
         x = F.relu(self.conv1(x))
@@ -65,6 +72,9 @@ class SRCNN(nn.Module):
         # Reconstruction
         x = self.conv3(x)
 
+        if self.upsampling == 'pixelshuffle':
+            x = F.pixel_shuffle(x, self.scale_factor)
+
         return x
 
     def get_num_params(self) -> int:
@@ -77,9 +87,13 @@ class EnhancedSRCNN(nn.Module):
     SRCNN mejorado con skip connections y más capas.
     """
 
-    def __init__(self, scale_factor: int = 2, num_features: int = 64):
+    def __init__(self, scale_factor: int = 2, num_features: int = 64, upsampling: str = 'bilinear'):
         super(EnhancedSRCNN, self).__init__()
         self.scale_factor = scale_factor
+        self.upsampling = upsampling
+
+        # Con PixelShuffle la última capa produce 3*s^2 canales en LR
+        out_channels = 3 * scale_factor ** 2 if upsampling == 'pixelshuffle' else 3
 
         # Encoder
         self.conv1 = nn.Conv2d(3, num_features, 9, padding=4)
@@ -88,7 +102,7 @@ class EnhancedSRCNN(nn.Module):
 
         # Decoder
         self.conv4 = nn.Conv2d(num_features//2, num_features, 3, padding=1)
-        self.conv5 = nn.Conv2d(num_features, 3, 5, padding=2)
+        self.conv5 = nn.Conv2d(num_features, out_channels, 5, padding=2)
 
         # Skip connection
         self.skip_conv = nn.Conv2d(3, 3, 1)
@@ -103,6 +117,9 @@ class EnhancedSRCNN(nn.Module):
                     nn.init.constant_(m.bias, 0)
 
     def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self.upsampling == 'pixelshuffle':
+            return self._forward_pixelshuffle(x)
+
         # Upscaling inicial
         upscaled = F.interpolate(x, scale_factor=self.scale_factor, mode='bilinear', align_corners=False)
 
@@ -120,28 +137,104 @@ class EnhancedSRCNN(nn.Module):
 
         return out + skip
 
+    def _forward_pixelshuffle(self, x: torch.Tensor) -> torch.Tensor:
+        # Todas las convs en resolución LR
+        x1 = F.relu(self.conv1(x))
+        x2 = F.relu(self.conv2(x1))
+        x3 = F.relu(self.conv3(x2))
+        x4 = F.relu(self.conv4(x3))
+        out = F.pixel_shuffle(self.conv5(x4), self.scale_factor)
+
+        # Skip 1x1 en LR: conmuta con la interpolación bilineal
+        skip = F.interpolate(self.skip_conv(x), scale_factor=self.scale_factor,
+                             mode='bilinear', align_corners=False)
+
+        return out + skip
+
     def get_num_params(self) -> int:
         return sum(p.numel() for p in self.parameters() if p.requires_grad)
 
 
-def create_model(model_name: str, scale_factor: int = 2) -> nn.Module:
+def compile_model(model: nn.Module, mode: str = 'reduce-overhead') -> nn.Module:
+    """
+    Compila el modelo con torch.compile (PyTorch >= 2.0) para fusionar
+    conv + bias + ReLU y eliminar el overhead de dispatch por operación.
+
+    Args:
+        model: Modelo a compilar
+        mode: Modo de torch.compile
+
+    Returns:
+        Modelo compilado, o el original si torch.compile no está disponible
+    """
+    if not hasattr(torch, 'compile'):
+        return model
+
+    try:
+        return torch.compile(model, mode=mode, fullgraph=True)
+    except Exception as e:
+        print(f"Advertencia: torch.compile no disponible ({str(e)}). Usando modo eager.")
+        return model
+
+
+def create_model(model_name: str, scale_factor: int = 2, compile: bool = False,
+                 upsampling: str = 'bilinear') -> nn.Module:
     """
     Factory function para crear modelos.
 
     Args:
         model_name: Nombre del modelo ('srcnn', 'enhanced_srcnn')
         scale_factor: Factor de escala
+        compile: Compilar el modelo con torch.compile
+        upsampling: 'bilinear' o 'pixelshuffle'
 
     Returns:
         Modelo instanciado
     """
     if model_name.lower() == 'srcnn':
-        return SRCNN(scale_factor=scale_factor)
+        model = SRCNN(scale_factor=scale_factor, upsampling=upsampling)
     elif model_name.lower() == 'enhanced_srcnn':
-        return EnhancedSRCNN(scale_factor=scale_factor)
+        model = EnhancedSRCNN(scale_factor=scale_factor, upsampling=upsampling)
     else:
         raise ValueError(f"Modelo desconocido: {model_name}")
 
+    # NHWC: las convs usan los kernels channels-last de oneDNN/cuDNN
+    model = model.to(memory_format=torch.channels_last)
+
+    if compile:
+        model = compile_model(model)
+
+    return model
+
+
+def quantize_model_int8(model: nn.Module, calibration_batches: list,
+                        backend: str = 'x86') -> nn.Module:
+    """
+    Cuantiza el modelo a int8 (post-training, FX) para inferencia en CPU.
+
+    Args:
+        model: Modelo en float32
+        calibration_batches: Lista de tensores (B, 3, H, W) en [0, 1] para calibrar
+        backend: Backend de cuantización ('x86' o 'qnnpack')
+
+    Returns:
+        Modelo cuantizado
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping, quantize_fx
+
+    model = getattr(model, '_orig_mod', model)
+    model.eval()
+
+    prepared = quantize_fx.prepare_fx(model, get_default_qconfig_mapping(backend),
+                                      example_inputs=(calibration_batches[0],))
+    with torch.no_grad():
+        for batch in calibration_batches:
+            prepared(batch)
+
+    quantized = quantize_fx.convert_fx(prepared)
+    quantized.scale_factor = getattr(model, 'scale_factor', 2)
+    return quantized
+
 
 def save_model_checkpoint(model: nn.Module, optimizer: torch.optim.Optimizer,
                          epoch: int, loss: float, filepath: str):
@@ -155,13 +248,17 @@ def save_model_checkpoint(model: nn.Module, optimizer: torch.optim.Optimizer,
         loss: Pérdida actual
         filepath: Path donde guardar
     """
+    # Desenvolver modelos compilados para guardar claves sin prefijo '_orig_mod.'
+    model = getattr(model, '_orig_mod', model)
+
     checkpoint = {
         'epoch': epoch,
         'model_state_dict': model.state_dict(),
         'optimizer_state_dict': optimizer.state_dict(),
         'loss': loss,
         'model_name': model.__class__.__name__,
-        'scale_factor': getattr(model, 'scale_factor', 2)
+        'scale_factor': getattr(model, 'scale_factor', 2),
+        'upsampling': getattr(model, 'upsampling', 'bilinear')
     }
 
     torch.save(checkpoint, filepath)
@@ -182,16 +279,22 @@ def load_model_checkpoint(filepath: str, device: str = 'cpu') -> Dict[str, Any]:
     if not Path(filepath).exists():
         raise FileNotFoundError(f"Checkpoint no encontrado: {filepath}")
 
-    checkpoint = torch.load(filepath, map_location=device)
+    try:
+        # mmap evita copiar todo el payload; weights_only omite el unpickling completo
+        checkpoint = torch.load(filepath, map_location=device, mmap=True, weights_only=True)
+    except TypeError:
+        # PyTorch < 2.1 no acepta mmap; se mantiene weights_only (nunca unpickling completo)
+        checkpoint = torch.load(filepath, map_location=device, weights_only=True)
 
     # Crear modelo
     model_name = checkpoint.get('model_name', 'SRCNN')
     scale_factor = checkpoint.get('scale_factor', 2)
+    upsampling = checkpoint.get('upsampling', 'bilinear')
 
     if model_name == 'SRCNN':
-        model = SRCNN(scale_factor=scale_factor)
+        model = SRCNN(scale_factor=scale_factor, upsampling=upsampling)
     elif model_name == 'EnhancedSRCNN':
-        model = EnhancedSRCNN(scale_factor=scale_factor)
+        model = EnhancedSRCNN(scale_factor=scale_factor, upsampling=upsampling)
     else:
         raise ValueError(f"Modelo desconocido en checkpoint: {model_name}")
 
@@ -225,7 +328,8 @@ def get_model_info(model: nn.Module) -> Dict[str, Any]:
     }
 
 
-def export_to_onnx(model: nn.Module, filepath: str, input_size: tuple = (1, 3, 256, 256)):
+def export_to_onnx(model: nn.Module, filepath: str, input_size: tuple = (1, 3, 256, 256),
+                   opset_version: int = 17):
     """
     Exporta modelo a ONNX para inferencia optimizada.
 
@@ -233,16 +337,21 @@ def export_to_onnx(model: nn.Module, filepath: str, input_size: tuple = (1, 3, 2
         model: Modelo PyTorch
         filepath: Path de salida
         input_size: Tamaño de input (B, C, H, W)
+        opset_version: Versión del opset ONNX
     """
+    model = getattr(model, '_orig_mod', model)
     model.eval()
     dummy_input = torch.randn(*input_size)
 
     torch.onnx.export(
         model, dummy_input, filepath,
         verbose=False,
+        opset_version=opset_version,
+        do_constant_folding=True,
         input_names=['input'],
         output_names=['output'],
-        dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}}
+        dynamic_axes={'input': {0: 'batch_size', 2: 'height', 3: 'width'},
+                      'output': {0: 'batch_size', 2: 'height', 3: 'width'}}
     )
 
-    print(f"Modelo exportado a ONNX: {filepath}")
\ No newline at end of file
+    print(f"Modelo exportado a ONNX: {filepath}")
@@ -1,6 +1,7 @@
+import os
+import threading
 import cv2
 import numpy as np
-import torch
 from pathlib import Path
 try:
     # When imported as module
@@ -13,7 +14,6 @@ try:
                                      apply_edge_enhancement, apply_compression_artifact_reduction,
                                      apply_intensity_transformation)
     from .utils.metrics import calculate_psnr, calculate_ssim, get_comprehensive_metrics
-    from .models import load_model_checkpoint, SRCNN
 except ImportError:
     # When run as standalone script
     from utils.imagen import normalize_image, convert_to_bgr, verify_image
@@ -25,19 +25,38 @@ except ImportError:
                                      apply_edge_enhancement, apply_compression_artifact_reduction,
                                      apply_intensity_transformation)
     from utils.metrics import calculate_psnr, calculate_ssim, get_comprehensive_metrics
-    from models import load_model_checkpoint, SRCNN
+
+# torch y los modelos se importan de forma lazy (solo en el camino SRCNN):
+# los métodos OpenCV no pagan el coste de arranque de PyTorch
+
+# ONNX Runtime (opcional) para inferencia en CPU
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
 
 # Modelos cargados de forma lazy
 _srcnn_model = None
 _realesrgan_model = None
+_ort_session = None
+# Factor de escala del modelo ONNX (medido al cargar) y lookup negativo cacheado
+_ort_session_scale = None
+_ort_session_unavailable = False
+
+# Buffers pinned (CUDA) por hilo, indexados por (H, W)
+_pinned_buffers = threading.local()
 
-def load_srcnn_model(model_path: str = "model/srcnn_best.pth", device: str = 'cpu'):
+def load_srcnn_model(model_path: str = "model/srcnn_best.pth", device: str = 'cpu',
+                     calibration_dir: str = None):
     """
     Carga el modelo SRCNN entrenado de forma lazy.
 
     Args:
         model_path: Path al modelo guardado
         device: Dispositivo
+        calibration_dir: Directorio con imágenes de calibración para cuantizar
+            a int8 en CPU (por defecto, variable SRCNN_CALIBRATION_DIR)
 
     Returns:
         Modelo cargado
@@ -46,15 +65,104 @@ def load_srcnn_model(model_path: str = "model/srcnn_best.pth", device: str = 'cp
     if _srcnn_model is not None:
         return _srcnn_model
 
+    import torch
+    try:
+        from .models import load_model_checkpoint, compile_model, quantize_model_int8
+    except ImportError:
+        from models import load_model_checkpoint, compile_model, quantize_model_int8
+
     try:
         checkpoint = load_model_checkpoint(model_path, device)
-        _srcnn_model = checkpoint['model']
+        _srcnn_model = checkpoint['model'].to(memory_format=torch.channels_last)
+        if calibration_dir is None:
+            calibration_dir = os.environ.get('SRCNN_CALIBRATION_DIR')
+
+        if torch.device(device).type == 'cuda':
+            # Grafo fusionado; las primeras pasadas por resolución hacen warmup
+            _srcnn_model = compile_model(_srcnn_model)
+        elif calibration_dir:
+            batches = _load_calibration_batches(calibration_dir)
+            if batches:
+                _srcnn_model = quantize_model_int8(_srcnn_model, batches)
+                print(f"SRCNN cuantizado a int8 ({len(batches)} batches de calibración)")
+
+        # Dispositivo cacheado: evita recorrer parámetros en cada inferencia
+        _srcnn_model._cached_device = torch.device(device)
         print(f"SRCNN cargado desde {model_path}")
         return _srcnn_model
     except Exception as e:
         print(f"Advertencia: No se pudo cargar SRCNN ({str(e)}). Usando upscaling básico.")
         return None
 
+def _load_calibration_batches(calibration_dir, num_patches=32, patch_size=64, batch_size=8):
+    """
+    Carga parches representativos para calibrar la cuantización int8.
+
+    Args:
+        calibration_dir: Directorio con imágenes
+        num_patches: Número máximo de parches
+        patch_size: Lado de cada parche (recorte central)
+        batch_size: Parches por batch
+
+    Returns:
+        Lista de tensores (B, 3, patch_size, patch_size) en [0, 1]
+    """
+    import torch
+
+    patches = []
+    for path in sorted(Path(calibration_dir).iterdir()):
+        if len(patches) >= num_patches:
+            break
+        if path.suffix.lower() not in ('.png', '.jpg', '.jpeg', '.webp'):
+            continue
+        image = cv2.imread(str(path), cv2.IMREAD_COLOR)
+        if image is None or min(image.shape[:2]) < patch_size:
+            continue
+        h, w = image.shape[:2]
+        y, x = (h - patch_size) // 2, (w - patch_size) // 2
+        patch = cv2.cvtColor(image[y:y + patch_size, x:x + patch_size], cv2.COLOR_BGR2RGB)
+        patches.append(torch.from_numpy(patch).permute(2, 0, 1).float().div_(255.0))
+
+    return [torch.stack(patches[i:i + batch_size]) for i in range(0, len(patches), batch_size)]
+
+def load_onnx_session(model_path: str = "model/srcnn_best.onnx"):
+    """
+    Carga de forma lazy una sesión de ONNX Runtime para SRCNN exportado.
+
+    Args:
+        model_path: Path al modelo ONNX (ver export_to_onnx)
+
+    Returns:
+        InferenceSession, o None si ONNX Runtime o el modelo no están disponibles
+    """
+    global _ort_session, _ort_session_scale, _ort_session_unavailable
+    if _ort_session is not None:
+        return _ort_session
+    if _ort_session_unavailable:
+        # Ya comprobado: sin stat del fichero en cada petición
+        return None
+
+    if not ONNXRUNTIME_AVAILABLE or not Path(model_path).exists():
+        _ort_session_unavailable = True
+        return None
+
+    try:
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = os.cpu_count() or 1
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(model_path, sess_options=sess_options,
+                                       providers=['CPUExecutionProvider'])
+        # El grafo exportado tiene ejes dinámicos: medir su factor de escala con una entrada mínima
+        probe = np.zeros((1, 3, 8, 8), dtype=np.float32)
+        _ort_session_scale = session.run(None, {'input': probe})[0].shape[2] // 8
+        _ort_session = session
+        print(f"SRCNN ONNX cargado desde {model_path} (x{_ort_session_scale})")
+        return _ort_session
+    except Exception as e:
+        print(f"Advertencia: No se pudo cargar ONNX ({str(e)}). Usando PyTorch.")
+        _ort_session_unavailable = True
+        return None
+
 def load_realesrgan_model():
     """
     Real-ESRGAN no disponible en HF Spaces por restricciones de descarga.
@@ -147,17 +255,24 @@ def apply_enhancement(image, scale_factor=2, method='srcnn', params=None):
 
     return image
 
-def apply_srcnn_enhancement(image, scale_factor=2):
+def apply_srcnn_enhancement(image, scale_factor=2, tile=256, tile_pad=16):
     """
     Aplica enhancement usando modelo SRCNN entrenado.
 
     Args:
         image: Imagen BGR
         scale_factor: Factor de escala
+        tile: Tamaño de tile LR para imágenes grandes (0 = sin tiling)
+        tile_pad: Contexto extra por lado de cada tile
 
     Returns:
         Imagen mejorada con SRCNN
     """
+    # Preferir ONNX Runtime si hay un modelo exportado con el mismo factor de escala
+    session = load_onnx_session()
+    if session is not None and _ort_session_scale == scale_factor:
+        return _apply_srcnn_onnx(session, image)
+
     model = load_srcnn_model()
     if model is None:
         # Fallback a upscaling básico
@@ -165,21 +280,174 @@ def apply_srcnn_enhancement(image, scale_factor=2):
         new_h, new_w = h * scale_factor, w * scale_factor
         return cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_CUBIC)
 
+    import torch
+
     # Preprocesamiento para el modelo
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    tensor_image = torch.from_numpy(rgb_image).float().permute(2, 0, 1).unsqueeze(0) / 255.0
+    # BGR -> RGB como vista invertida (sin copia); se materializa una sola vez
+    rgb_view = image[..., ::-1]
+    h, w = image.shape[:2]
+    device = getattr(model, '_cached_device', None)
+    if device is None:
+        param = next(model.parameters(), None)
+        device = param.device if param is not None else torch.device('cpu')
+
+    if device.type == 'cuda':
+        pinned_in, pinned_out = _get_pinned_buffers(h, w, scale_factor)
+        pinned_in.numpy()[...] = rgb_view
+        host_in = pinned_in
+    else:
+        host_in = torch.from_numpy(np.ascontiguousarray(rgb_view))
 
-    device = next(model.parameters()).device
-    tensor_image = tensor_image.to(device)
+    # HWC -> (1, 3, H, W) en channels-last: vista sin copia; cast y /255 en el dispositivo
+    tensor_image = host_in.permute(2, 0, 1).unsqueeze(0)
+    tensor_image = tensor_image.to(device, dtype=torch.float32, non_blocking=True).mul_(1.0 / 255.0)
 
-    # Inferencia
+    # Inferencia (por tiles si la imagen es grande, para acotar memoria)
     with torch.no_grad():
-        output = model(tensor_image)
+        if tile and max(h, w) > tile + 2 * tile_pad:
+            output = _srcnn_forward_tiled(model, tensor_image, tile, tile_pad)
+        else:
+            output = model(tensor_image)
+
+    # Post-procesamiento (cuantizar en el dispositivo: 4x menos datos a transferir)
+    output = output.clamp_(0, 1).mul_(255).to(torch.uint8)
+    # RGB -> BGR invirtiendo canales en el dispositivo
+    output = output.squeeze(0).permute(1, 2, 0).flip(-1)
+    if device.type == 'cuda' and pinned_out.shape == output.shape:
+        pinned_out.copy_(output, non_blocking=True)
+        torch.cuda.current_stream(device).synchronize()
+        return pinned_out.numpy().copy()
+    return np.ascontiguousarray(output.cpu().numpy())
+
+
+def _apply_srcnn_onnx(session, image):
+    """
+    Inferencia SRCNN con ONNX Runtime (sin pasar por PyTorch).
 
-    # Post-procesamiento
-    output = torch.clamp(output, 0, 1)
-    output_np = (output.squeeze(0).permute(1, 2, 0).cpu().numpy() * 255).astype(np.uint8)
-    return cv2.cvtColor(output_np, cv2.COLOR_RGB2BGR)
+    Args:
+        session: InferenceSession de ONNX Runtime
+        image: Imagen BGR
+
+    Returns:
+        Imagen mejorada (BGR)
+    """
+    h, w = image.shape[:2]
+
+    # HWC BGR uint8 -> NCHW RGB float32 en [0, 1] con una sola escritura (vistas sin copia)
+    input_np = np.empty((1, 3, h, w), dtype=np.float32)
+    np.multiply(image[..., ::-1].transpose(2, 0, 1), np.float32(1.0 / 255.0), out=input_np[0])
+
+    output = session.run(None, {'input': input_np})[0][0]
+
+    np.clip(output, 0, 1, out=output)
+    output *= 255
+    # CHW RGB -> HWC BGR: una sola copia contigua
+    return np.ascontiguousarray(output.astype(np.uint8)[::-1].transpose(1, 2, 0))
+
+
+def _srcnn_forward_tiled(model, tensor_image, tile=256, pad=16, tile_batch=8):
+    """
+    Ejecuta el modelo por tiles solapados y los une en la salida.
+
+    Cada ventana mide (tile + 2*pad) y se desplaza dentro de la imagen en los
+    bordes, de modo que todas tienen el mismo tamaño y se procesan en batch.
+    El contexto de pad supera el campo receptivo de SRCNN, así que el
+    resultado coincide con el forward completo.
+
+    Args:
+        model: Modelo SRCNN
+        tensor_image: Tensor (1, 3, H, W) en el dispositivo del modelo
+        tile: Tamaño del tile LR
+        pad: Contexto extra por lado
+        tile_batch: Número de tiles por forward
+
+    Returns:
+        Tensor (1, 3, H*s, W*s)
+    """
+    import torch
+
+    _, c, h, w = tensor_image.shape
+    s = getattr(model, 'scale_factor', 2)
+    win_h, win_w = min(tile + 2 * pad, h), min(tile + 2 * pad, w)
+
+    # Ventanas (y0, x0) y región útil (y, x, th, tw) de cada tile
+    windows = []
+    for y in range(0, h, tile):
+        for x in range(0, w, tile):
+            th, tw = min(tile, h - y), min(tile, w - x)
+            y0 = min(max(y - pad, 0), h - win_h)
+            x0 = min(max(x - pad, 0), w - win_w)
+            windows.append((y0, x0, y, x, th, tw))
+
+    output = torch.empty((1, c, h * s, w * s), dtype=tensor_image.dtype,
+                         device=tensor_image.device, memory_format=torch.channels_last)
+
+    for i in range(0, len(windows), tile_batch):
+        group = windows[i:i + tile_batch]
+        batch = torch.cat([tensor_image[:, :, y0:y0 + win_h, x0:x0 + win_w]
+                           for y0, x0, _, _, _, _ in group])
+        result = model(batch.contiguous(memory_format=torch.channels_last))
+
+        for out_tile, (y0, x0, y, x, th, tw) in zip(result, group):
+            oy, ox = (y - y0) * s, (x - x0) * s
+            output[0, :, y * s:(y + th) * s, x * s:(x + tw) * s] = \
+                out_tile[:, oy:oy + th * s, ox:ox + tw * s]
+
+    return output
+
+
+def _get_pinned_buffers(h, w, scale_factor):
+    """
+    Obtiene (o crea) los buffers pinned de entrada/salida para una resolución.
+
+    Args:
+        h: Alto de la imagen de entrada
+        w: Ancho de la imagen de entrada
+        scale_factor: Factor de escala
+
+    Returns:
+        Tuple: (buffer_entrada, buffer_salida) uint8 HWC
+    """
+    import torch
+
+    cache = getattr(_pinned_buffers, 'cache', None)
+    if cache is None:
+        cache = _pinned_buffers.cache = {}
+
+    key = (h, w, scale_factor)
+    if key not in cache:
+        cache.clear()
+        cache[key] = (
+            torch.empty((h, w, 3), dtype=torch.uint8, pin_memory=True),
+            torch.empty((h * scale_factor, w * scale_factor, 3), dtype=torch.uint8, pin_memory=True)
+        )
+    return cache[key]
+
+
+def _metrics_resize(original, processed, max_side=512):
+    """
+    Reduce ambas imágenes a un lado máximo común para calcular métricas.
+
+    Args:
+        original: Imagen original
+        processed: Imagen procesada
+        max_side: Lado máximo para las métricas
+
+    Returns:
+        Tuple: (original_reducida, procesada_reducida) del mismo tamaño
+    """
+    h, w = original.shape[:2]
+    scale = max_side / max(h, w)
+    if scale < 1:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        original = cv2.resize(original, size, interpolation=cv2.INTER_AREA)
+    else:
+        size = (w, h)
+
+    if processed.shape[:2] != original.shape[:2]:
+        processed = cv2.resize(processed, size, interpolation=cv2.INTER_AREA)
+
+    return original, processed
 
 
 def image_enhancement_pipeline(image_path, enhancement_type="restauracion", enhancement_method="opencv",
@@ -218,8 +486,8 @@ def image_enhancement_pipeline(image_path, enhancement_type="restauracion", enha
     # Normalizar resultado
     processed = normalize_image(processed)
 
-    # Calcular métricas comprehensivas
-    metrics = get_comprehensive_metrics(original, processed)
+    # Calcular métricas comprehensivas (sobre versiones reducidas)
+    metrics = get_comprehensive_metrics(*_metrics_resize(original, processed))
 
     # Reporte detallado
     report = f"""🎨 Procesamiento Completado
@@ -283,7 +551,7 @@ def process_image_for_gradio(image, enhancement_type="restauracion", enhancement
 
     # Calcular métricas
     original_bgr = bgr_image
-    metrics = get_comprehensive_metrics(original_bgr, processed_bgr)
+    metrics = get_comprehensive_metrics(*_metrics_resize(original_bgr, processed_bgr))
 
     # Reporte para Gradio
     report = f"""✅ Procesamiento Completado
@@ -21,19 +21,50 @@ def normalize_image(image: np.ndarray) -> np.ndarray:
     if image.dtype == np.uint8:
         return image
 
-    # Convertir a float si es necesario
-    if image.dtype != np.float32 and image.dtype != np.float64:
-        image = image.astype(np.float32)
+    # Una sola copia float32; el resto de operaciones son in-place
+    out = image.astype(np.float32)
 
     # Normalizar al rango [0, 1] si está en otro rango
-    if image.max() > 1.0:
-        image = image / 255.0
+    if out.max() > 1.0:
+        out /= 255.0
 
-    # Asegurar rango [0, 1]
-    image = np.clip(image, 0.0, 1.0)
+    # Asegurar rango [0, 1] y convertir a uint8
+    np.clip(out, 0.0, 1.0, out=out)
+    out *= 255
+    return out.astype(np.uint8)
 
-    # Convertir a uint8
-    return (image * 255).astype(np.uint8)
+
+def fast_bilateral_filter(image: np.ndarray, d: int, sigma_color: float, sigma_space: float,
+                          strength: float = 1.0, max_side: int = 1024) -> np.ndarray:
+    """
+    Filtro bilateral que, en imágenes grandes, trabaja a media resolución.
+
+    El coste de cv2.bilateralFilter es O(W·H·d²); si el lado menor supera
+    max_side se filtra la imagen reducida a la mitad (con d y sigma_space
+    a la mitad, misma extensión espacial), se reescala el resultado y se mezcla
+    con el original a resolución completa para recuperar el detalle fino.
+
+    Args:
+        image: Imagen de entrada
+        d: Diámetro del vecindario
+        sigma_color: Sigma en el espacio de color
+        sigma_space: Sigma espacial
+        strength: Peso del resultado suavizado en la mezcla con el original (0-1),
+            solo en media resolución
+        max_side: Lado menor a partir del cual se usa media resolución
+
+    Returns:
+        Imagen filtrada
+    """
+    h, w = image.shape[:2]
+    if min(h, w) <= max_side:
+        return cv2.bilateralFilter(image, d, sigma_color, sigma_space)
+
+    small = cv2.resize(image, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+    small = cv2.bilateralFilter(small, max(1, (d + 1) // 2), sigma_color, sigma_space / 2)
+    smoothed = cv2.resize(small, (w, h), interpolation=cv2.INTER_CUBIC)
+    strength = float(np.clip(strength, 0.0, 1.0))
+    return cv2.addWeighted(smoothed, strength, image, 1.0 - strength, 0)
 
 
 def convert_to_bgr(image: np.ndarray) -> np.ndarray:
@@ -132,6 +163,12 @@ def pad_image_to_size(image: np.ndarray, target_size: Tuple[int, int], pad_color
     pad_top = (target_h - h) // 2
     pad_bottom = target_h - h - pad_top
 
+    # Relleno negro: buffer a cero (páginas ya puestas a cero) + una sola copia
+    if not any(pad_color) and min(pad_left, pad_right, pad_top, pad_bottom) >= 0:
+        padded = np.zeros((target_h, target_w) + image.shape[2:], dtype=image.dtype)
+        padded[pad_top:pad_top + h, pad_left:pad_left + w] = image
+        return padded
+
     padded = cv2.copyMakeBorder(
         image,
         pad_top, pad_bottom, pad_left, pad_right,
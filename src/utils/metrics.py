@@ -7,6 +7,12 @@ import cv2
 import numpy as np
 from typing import Tuple, Dict
 
+# Tipos soportados por cv2.norm
+_NORM_DTYPES = (np.uint8, np.int8, np.uint16, np.int16, np.int32, np.float32, np.float64)
+
+# Kernels gaussianos 1D de SSIM, por tamaño de ventana
+_SSIM_KERNELS: Dict[int, np.ndarray] = {}
+
 
 def calculate_psnr(original: np.ndarray, processed: np.ndarray) -> float:
     """
@@ -23,21 +29,31 @@ def calculate_psnr(original: np.ndarray, processed: np.ndarray) -> float:
     if original.shape != processed.shape:
         processed = cv2.resize(processed, (original.shape[1], original.shape[0]))
 
-    # Convertir a float
-    original = original.astype(np.float64)
-    processed = processed.astype(np.float64)
+    return _compute_mse_psnr(original, processed)[1]
+
 
-    # Calcular MSE
-    mse = np.mean((original - processed) ** 2)
+def _compute_mse_psnr(original: np.ndarray, processed: np.ndarray) -> Tuple[float, float]:
+    """
+    Calcula MSE y PSNR a partir de una única reducción.
+
+    Args:
+        original: Imagen original
+        processed: Imagen procesada (mismo tamaño)
+
+    Returns:
+        Tuple: (mse, psnr)
+    """
+    # Calcular MSE (reducción en una pasada, sin copias float64)
+    mse = _squared_error_sum(original, processed) / original.size
 
     if mse == 0:
-        return float('inf')
+        return mse, float('inf')
 
     # Calcular PSNR
     max_pixel = 255.0
     psnr = 20 * np.log10(max_pixel / np.sqrt(mse))
 
-    return psnr
+    return mse, psnr
 
 
 def calculate_ssim(original: np.ndarray, processed: np.ndarray, win_size: int = 11) -> float:
@@ -56,33 +72,69 @@ def calculate_ssim(original: np.ndarray, processed: np.ndarray, win_size: int =
     if original.shape != processed.shape:
         processed = cv2.resize(processed, (original.shape[1], original.shape[0]))
 
-    # Convertir a float
-    original = original.astype(np.float64)
-    processed = processed.astype(np.float64)
+    # Convertir a float32 (mitad de ancho de banda que float64)
+    original = original.astype(np.float32)
+    processed = processed.astype(np.float32)
 
     # Constantes
     C1 = (0.01 * 255) ** 2
     C2 = (0.03 * 255) ** 2
 
-    # Calcular medias locales
-    mu1 = cv2.GaussianBlur(original, (win_size, win_size), 0)
-    mu2 = cv2.GaussianBlur(processed, (win_size, win_size), 0)
+    # Kernel gaussiano 1D separable (mismo sigma que GaussianBlur con sigma=0)
+    k1d = _get_ssim_kernel(win_size)
+
+    def blur(x):
+        return cv2.sepFilter2D(x, cv2.CV_32F, k1d, k1d)
 
-    mu1_sq = mu1 ** 2
-    mu2_sq = mu2 ** 2
+    # Calcular medias locales y momentos de segundo orden
+    mu1 = blur(original)
+    mu2 = blur(processed)
+    s11 = blur(original * original)
+    s22 = blur(processed * processed)
+    s12 = blur(original * processed)
+
+    # Mapa SSIM con operaciones in-place: sin temporales del tamaño de la imagen
     mu1_mu2 = mu1 * mu2
+    np.multiply(mu1, mu1, out=mu1)  # mu1^2
+    np.multiply(mu2, mu2, out=mu2)  # mu2^2
+
+    # Varianzas y covarianza
+    s11 -= mu1
+    s22 -= mu2
+    s12 -= mu1_mu2
+
+    # Numerador: (2*mu1*mu2 + C1) * (2*sigma12 + C2)
+    mu1_mu2 *= 2
+    mu1_mu2 += C1
+    s12 *= 2
+    s12 += C2
+    mu1_mu2 *= s12
 
-    # Calcular varianzas y covarianza
-    sigma1_sq = cv2.GaussianBlur(original ** 2, (win_size, win_size), 0) - mu1_sq
-    sigma2_sq = cv2.GaussianBlur(processed ** 2, (win_size, win_size), 0) - mu2_sq
-    sigma12 = cv2.GaussianBlur(original * processed, (win_size, win_size), 0) - mu1_mu2
+    # Denominador: (mu1^2 + mu2^2 + C1) * (sigma1^2 + sigma2^2 + C2)
+    mu1 += mu2
+    mu1 += C1
+    s11 += s22
+    s11 += C2
+    mu1 *= s11
 
-    # Calcular SSIM
-    numerator = (2 * mu1_mu2 + C1) * (2 * sigma12 + C2)
-    denominator = (mu1_sq + mu2_sq + C1) * (sigma1_sq + sigma2_sq + C2)
+    mu1_mu2 /= mu1
+    return float(np.mean(mu1_mu2, dtype=np.float64))
+
+
+def _get_ssim_kernel(win_size: int) -> np.ndarray:
+    """
+    Obtiene (y cachea) el kernel gaussiano 1D para SSIM.
 
-    ssim_map = numerator / denominator
-    return np.mean(ssim_map)
+    Args:
+        win_size: Tamaño de la ventana
+
+    Returns:
+        Kernel (win_size, 1) float32
+    """
+    kernel = _SSIM_KERNELS.get(win_size)
+    if kernel is None:
+        kernel = _SSIM_KERNELS[win_size] = cv2.getGaussianKernel(win_size, 0, cv2.CV_32F)
+    return kernel
 
 
 def calculate_mse(original: np.ndarray, processed: np.ndarray) -> float:
@@ -99,7 +151,28 @@ def calculate_mse(original: np.ndarray, processed: np.ndarray) -> float:
     if original.shape != processed.shape:
         processed = cv2.resize(processed, (original.shape[1], original.shape[0]))
 
-    return np.mean((original.astype(np.float64) - processed.astype(np.float64)) ** 2)
+    return _squared_error_sum(original, processed) / original.size
+
+
+def _squared_error_sum(original: np.ndarray, processed: np.ndarray) -> float:
+    """
+    Suma de errores cuadráticos entre dos imágenes del mismo tamaño.
+
+    Usa cv2.norm(NORM_L2SQR), que reduce directamente sobre uint8/float32
+    sin temporales; otros tipos caen a NumPy en float64.
+
+    Args:
+        original: Imagen original
+        processed: Imagen procesada
+
+    Returns:
+        Suma de (original - processed)^2
+    """
+    if original.dtype == processed.dtype and original.dtype in _NORM_DTYPES:
+        return cv2.norm(original, processed, cv2.NORM_L2SQR)
+
+    diff = original.astype(np.float64) - processed.astype(np.float64)
+    return float(np.dot(diff.ravel(), diff.ravel()))
 
 
 def calculate_rmse(original: np.ndarray, processed: np.ndarray) -> float:
@@ -127,11 +200,18 @@ def calculate_image_quality_metrics(original: np.ndarray, processed: np.ndarray)
     Returns:
         Dict con métricas
     """
+    # Asegurar mismo tamaño una sola vez
+    if original.shape != processed.shape:
+        processed = cv2.resize(processed, (original.shape[1], original.shape[0]))
+
+    # MSE compartido por PSNR y RMSE
+    mse, psnr = _compute_mse_psnr(original, processed)
+
     return {
-        'psnr': calculate_psnr(original, processed),
+        'psnr': psnr,
         'ssim': calculate_ssim(original, processed),
-        'mse': calculate_mse(original, processed),
-        'rmse': calculate_rmse(original, processed)
+        'mse': mse,
+        'rmse': np.sqrt(mse)
     }
 
 
@@ -146,23 +226,15 @@ def calculate_histogram_similarity(original: np.ndarray, processed: np.ndarray)
     Returns:
         Correlación de histogramas (0-1)
     """
-    # Convertir a HSV para mejor comparación de color
+    # Canal V (brillo) de HSV: max(B, G, R), sin la conversión HSV completa
     if len(original.shape) == 3:
-        original_hsv = cv2.cvtColor(original, cv2.COLOR_BGR2HSV)
-        processed_hsv = cv2.cvtColor(processed, cv2.COLOR_BGR2HSV)
+        original = cv2.max(cv2.max(original[:, :, 0], original[:, :, 1]), original[:, :, 2])
+        processed = cv2.max(cv2.max(processed[:, :, 0], processed[:, :, 1]), processed[:, :, 2])
 
-        # Calcular histogramas para canal V (brillo)
-        hist_orig = cv2.calcHist([original_hsv], [2], None, [256], [0, 256])
-        hist_proc = cv2.calcHist([processed_hsv], [2], None, [256], [0, 256])
-    else:
-        hist_orig = cv2.calcHist([original], [0], None, [256], [0, 256])
-        hist_proc = cv2.calcHist([processed], [0], None, [256], [0, 256])
+    hist_orig = cv2.calcHist([original], [0], None, [256], [0, 256])
+    hist_proc = cv2.calcHist([processed], [0], None, [256], [0, 256])
 
-    # Normalizar histogramas
-    hist_orig = cv2.normalize(hist_orig, hist_orig).flatten()
-    hist_proc = cv2.normalize(hist_proc, hist_proc).flatten()
-
-    # Calcular correlación
+    # La correlación es invariante a escala: no hace falta normalizar
     correlation = cv2.compareHist(hist_orig, hist_proc, cv2.HISTCMP_CORREL)
 
     # Convertir a escala 0-1 (correlación va de -1 a 1)
@@ -189,13 +261,11 @@ def calculate_edge_preservation(original: np.ndarray, processed: np.ndarray) ->
         proc_gray = processed
 
     # Calcular gradientes
-    grad_orig_x = cv2.Sobel(orig_gray, cv2.CV_64F, 1, 0, ksize=3)
-    grad_orig_y = cv2.Sobel(orig_gray, cv2.CV_64F, 0, 1, ksize=3)
-    grad_orig = np.sqrt(grad_orig_x**2 + grad_orig_y**2)
-
-    grad_proc_x = cv2.Sobel(proc_gray, cv2.CV_64F, 1, 0, ksize=3)
-    grad_proc_y = cv2.Sobel(proc_gray, cv2.CV_64F, 0, 1, ksize=3)
-    grad_proc = np.sqrt(grad_proc_x**2 + grad_proc_y**2)
+    # Magnitud del gradiente en float32 (cv2.magnitude fusiona sqrt(x^2 + y^2))
+    grad_orig = cv2.magnitude(cv2.Sobel(orig_gray, cv2.CV_32F, 1, 0, ksize=3),
+                              cv2.Sobel(orig_gray, cv2.CV_32F, 0, 1, ksize=3))
+    grad_proc = cv2.magnitude(cv2.Sobel(proc_gray, cv2.CV_32F, 1, 0, ksize=3),
+                              cv2.Sobel(proc_gray, cv2.CV_32F, 0, 1, ksize=3))
 
     # Calcular similitud de gradientes
     return calculate_ssim(grad_orig.astype(np.uint8), grad_proc.astype(np.uint8))
@@ -212,6 +282,10 @@ def get_comprehensive_metrics(original: np.ndarray, processed: np.ndarray) -> Di
     Returns:
         Dict con todas las métricas
     """
+    # Alinear tamaños una sola vez; todas las métricas reciben las mismas imágenes
+    if original.shape != processed.shape:
+        processed = cv2.resize(processed, (original.shape[1], original.shape[0]))
+
     basic_metrics = calculate_image_quality_metrics(original, processed)
 
     additional_metrics = {
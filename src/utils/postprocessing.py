@@ -3,10 +3,13 @@ Funciones de postprocesamiento de imágenes.
 Incluye nitidez, denoising, ajustes finales de contraste.
 """
 
+from functools import lru_cache
 import cv2
 import numpy as np
 from typing import Tuple
 
+from .imagen import fast_bilateral_filter
+
 
 def apply_sharpening(image: np.ndarray, strength: float = 0.5) -> np.ndarray:
     """
@@ -22,16 +25,11 @@ def apply_sharpening(image: np.ndarray, strength: float = 0.5) -> np.ndarray:
     if strength <= 0:
         return image
 
-    # Kernel unsharp mask
-    kernel = np.array([[-1, -1, -1],
-                       [-1,  9, -1],
-                       [-1, -1, -1]], dtype=np.float32)
-
-    # Aplicar filtro
-    sharpened = cv2.filter2D(image, -1, kernel * strength)
+    # Unsharp mask: image + strength * (image - blur(image))
+    blur = cv2.GaussianBlur(image, (0, 0), sigmaX=1.0)
 
-    # Mezclar con original para controlar la intensidad
-    return cv2.addWeighted(image, 1 - strength, sharpened, strength, 0)
+    # Multiplicación, suma y saturación en una sola pasada
+    return cv2.addWeighted(image, 1 + strength, blur, -strength, 0)
 
 
 def apply_adaptive_sharpening(image: np.ndarray, strength: float = 0.5) -> np.ndarray:
@@ -50,7 +48,9 @@ def apply_adaptive_sharpening(image: np.ndarray, strength: float = 0.5) -> np.nd
 
     # Calcular varianza local como medida de detalle
     blur = cv2.GaussianBlur(gray, (3, 3), 0)
-    variance = cv2.Laplacian(blur, cv2.CV_64F).var()
+    # Laplaciano en int16 (exacto para uint8) y varianza con meanStdDev en una pasada
+    _, stddev = cv2.meanStdDev(cv2.Laplacian(blur, cv2.CV_16S))
+    variance = float(stddev[0, 0]) ** 2
 
     # Ajustar strength basado en la varianza
     # Imágenes con bajo detalle necesitan más nitidez
@@ -79,7 +79,7 @@ def apply_bilateral_denoise(image: np.ndarray, strength: float = 0.5) -> np.ndar
     sigma_color = max(10, int(75 * strength))
     sigma_space = max(10, int(75 * strength))
 
-    return cv2.bilateralFilter(image, d, sigma_color, sigma_space)
+    return fast_bilateral_filter(image, d, sigma_color, sigma_space, strength)
 
 
 def apply_morphological_operations(image: np.ndarray, operation: str = 'opening', kernel_size: int = 3) -> np.ndarray:
@@ -94,7 +94,7 @@ def apply_morphological_operations(image: np.ndarray, operation: str = 'opening'
     Returns:
         Imagen procesada
     """
-    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_size, kernel_size))
+    kernel = _get_structuring_element(cv2.MORPH_RECT, kernel_size)
 
     if operation == 'opening':
         morph_func = cv2.morphologyEx
@@ -111,12 +111,25 @@ def apply_morphological_operations(image: np.ndarray, operation: str = 'opening'
     else:
         return image
 
-    # Para opening/closing, aplicar a cada canal por separado
-    result = image.copy()
-    for i in range(3):
-        result[:, :, i] = morph_func(image[:, :, i], operation_type, kernel)
+    # morphologyEx opera canal a canal internamente: una sola llamada
+    return morph_func(image, operation_type, kernel)
 
-    return result
+
+@lru_cache(maxsize=16)
+def _get_structuring_element(shape: int, kernel_size: int) -> np.ndarray:
+    """
+    Devuelve (cacheado) el elemento estructurante para operaciones morfológicas.
+
+    Args:
+        shape: Forma de OpenCV (cv2.MORPH_RECT, cv2.MORPH_ELLIPSE, ...)
+        kernel_size: Tamaño del kernel
+
+    Returns:
+        Kernel de solo lectura
+    """
+    kernel = cv2.getStructuringElement(shape, (kernel_size, kernel_size))
+    kernel.flags.writeable = False
+    return kernel
 
 
 def final_contrast_adjustment(image: np.ndarray, method: str = 'auto') -> np.ndarray:
@@ -134,11 +147,18 @@ def final_contrast_adjustment(image: np.ndarray, method: str = 'auto') -> np.nda
         # Auto contraste basado en percentiles
         img_yuv = cv2.cvtColor(image, cv2.COLOR_BGR2YUV)
 
-        # Calcular percentiles para stretching
-        p1, p99 = np.percentile(img_yuv[:, :, 0], (1, 99))
-        img_yuv[:, :, 0] = np.clip((img_yuv[:, :, 0] - p1) / (p99 - p1) * 255, 0, 255)
+        # Calcular percentiles para stretching (desde el histograma, sin ordenar)
+        y = img_yuv[:, :, 0]
+        p1, p99 = _histogram_percentiles(y, (1, 99))
+        if p99 <= p1:
+            # Luminancia plana: no hay rango que estirar
+            return image
+
+        # Stretching como LUT de 256 entradas
+        lut = np.clip((np.arange(256) - p1) / (p99 - p1) * 255, 0, 255).astype(np.uint8)
+        img_yuv[:, :, 0] = cv2.LUT(y, lut)
 
-        return cv2.cvtColor(img_yuv.astype(np.uint8), cv2.COLOR_YUV2BGR)
+        return cv2.cvtColor(img_yuv, cv2.COLOR_YUV2BGR)
 
     elif method == 'stretch':
         # Contrast stretching simple
@@ -150,6 +170,35 @@ def final_contrast_adjustment(image: np.ndarray, method: str = 'auto') -> np.nda
         return image
 
 
+def _histogram_percentiles(channel: np.ndarray, percentiles: Tuple[float, ...]) -> Tuple[float, ...]:
+    """
+    Percentiles de un canal uint8 a partir de su histograma de 256 bins.
+
+    Reproduce la interpolación lineal de np.percentile sin ordenar los píxeles.
+
+    Args:
+        channel: Canal uint8
+        percentiles: Percentiles a calcular (0-100)
+
+    Returns:
+        Tuple con los percentiles
+    """
+    hist = cv2.calcHist([channel], [0], None, [256], [0, 256]).ravel()
+    cdf = np.cumsum(hist)
+    n = int(cdf[-1])
+
+    results = []
+    for q in percentiles:
+        pos = q / 100.0 * (n - 1)
+        lo = int(np.floor(pos))
+        hi = min(lo + 1, n - 1)
+        # Valor del k-ésimo elemento ordenado: primer bin con cdf > k
+        v_lo, v_hi = np.searchsorted(cdf, (lo, hi), side='right')
+        results.append(float(v_lo + (pos - lo) * (v_hi - v_lo)))
+
+    return tuple(results)
+
+
 def apply_edge_enhancement(image: np.ndarray, strength: float = 0.5) -> np.ndarray:
     """
     Mejora bordes usando filtro de realce.
@@ -189,9 +238,27 @@ def apply_intensity_transformation(image: np.ndarray, gamma: float = 1.0, contra
     Returns:
         Imagen transformada
     """
-    # Convertir a float
-    img_float = image.astype(np.float32)
+    # uint8: solo hay 256 valores posibles; se transforma una tabla y se aplica con cv2.LUT
+    if image.dtype == np.uint8:
+        table = _intensity_transform(np.arange(256, dtype=np.float32), gamma, contrast, brightness)
+        return cv2.LUT(image, table)
+
+    return _intensity_transform(image.astype(np.float32), gamma, contrast, brightness)
 
+
+def _intensity_transform(img_float: np.ndarray, gamma: float, contrast: float, brightness: int) -> np.ndarray:
+    """
+    Transformación de intensidad sobre valores float32 (imagen o tabla LUT).
+
+    Args:
+        img_float: Valores float32
+        gamma: Corrección gamma
+        contrast: Factor de contraste
+        brightness: Ajuste de brillo
+
+    Returns:
+        Valores transformados uint8
+    """
     # Aplicar brillo
     img_float += brightness
 
@@ -3,10 +3,16 @@ Funciones de preprocesamiento de imágenes.
 Incluye balance de blancos, CLAHE, reducción de artefactos JPEG.
 """
 
+import threading
 import cv2
 import numpy as np
 from typing import Tuple
 
+from .imagen import fast_bilateral_filter
+
+# Caché de objetos CLAHE por hilo (cv2.CLAHE no es seguro entre hilos)
+_tls = threading.local()
+
 
 def apply_white_balance(image: np.ndarray) -> np.ndarray:
     """
@@ -18,24 +24,17 @@ def apply_white_balance(image: np.ndarray) -> np.ndarray:
     Returns:
         Imagen con balance de blancos corregido
     """
-    # Convertir a float32 para cálculos
-    img_float = image.astype(np.float32)
-
-    # Calcular promedio de cada canal
-    avg_b = np.mean(img_float[:, :, 0])
-    avg_g = np.mean(img_float[:, :, 1])
-    avg_r = np.mean(img_float[:, :, 2])
+    # Promedio de cada canal en una sola pasada
+    avg_b, avg_g, avg_r = cv2.mean(image)[:3]
 
     # Calcular promedio global
     avg_gray = (avg_b + avg_g + avg_r) / 3.0
 
-    # Corregir cada canal
-    img_float[:, :, 0] = img_float[:, :, 0] * (avg_gray / avg_b) if avg_b > 0 else img_float[:, :, 0]
-    img_float[:, :, 1] = img_float[:, :, 1] * (avg_gray / avg_g) if avg_g > 0 else img_float[:, :, 1]
-    img_float[:, :, 2] = img_float[:, :, 2] * (avg_gray / avg_r) if avg_r > 0 else img_float[:, :, 2]
+    # Ganancia por canal (1.0 si el canal está vacío)
+    gains = tuple(avg_gray / avg if avg > 0 else 1.0 for avg in (avg_b, avg_g, avg_r)) + (1.0,)
 
-    # Clip y convertir de vuelta
-    return np.clip(img_float, 0, 255).astype(np.uint8)
+    # Multiplicar, saturar y convertir a uint8 en una sola pasada
+    return cv2.multiply(image, gains, dtype=cv2.CV_8U)
 
 
 def apply_clahe(image: np.ndarray, clip_limit: float = 2.0, tile_grid_size: Tuple[int, int] = (8, 8)) -> np.ndarray:
@@ -54,13 +53,34 @@ def apply_clahe(image: np.ndarray, clip_limit: float = 2.0, tile_grid_size: Tupl
     lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
 
     # Aplicar CLAHE al canal L (luminancia)
-    clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+    clahe = _get_clahe(clip_limit, tuple(tile_grid_size))
     lab[:, :, 0] = clahe.apply(lab[:, :, 0])
 
     # Convertir de vuelta a BGR
     return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
 
 
+def _get_clahe(clip_limit: float, tile_grid_size: Tuple[int, int]) -> cv2.CLAHE:
+    """
+    Devuelve un objeto CLAHE reutilizable, cacheado por hilo.
+
+    Args:
+        clip_limit: Límite de recorte para CLAHE
+        tile_grid_size: Tamaño de la cuadrícula de tiles
+
+    Returns:
+        Objeto cv2.CLAHE
+    """
+    cache = getattr(_tls, 'clahe', None)
+    if cache is None:
+        cache = _tls.clahe = {}
+    key = (clip_limit, tile_grid_size)
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cache[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+    return clahe
+
+
 def reduce_jpeg_artifacts(image: np.ndarray, strength: float = 0.5) -> np.ndarray:
     """
     Reduce artefactos de compresión JPEG usando filtro bilateral.
@@ -81,7 +101,7 @@ def reduce_jpeg_artifacts(image: np.ndarray, strength: float = 0.5) -> np.ndarra
     sigma_color = max(10, int(100 * strength))
     sigma_space = max(10, int(100 * strength))
 
-    return cv2.bilateralFilter(image, d, sigma_color, sigma_space)
+    return fast_bilateral_filter(image, d, sigma_color, sigma_space, strength)
 
 
 def enhance_contrast_adaptive(image: np.ndarray, method: str = 'clahe') -> np.ndarray:
@@ -100,7 +120,8 @@ def enhance_contrast_adaptive(image: np.ndarray, method: str = 'clahe') -> np.nd
     elif method == 'gamma':
         # Corrección gamma adaptativa
         gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        mean_brightness = np.mean(gray) / 255.0
+        # cv2.mean acumula directamente sobre uint8 (sin upcast a float64)
+        mean_brightness = cv2.mean(gray)[0] / 255.0
         gamma = 1.0 / (mean_brightness + 0.1)  # Evitar división por cero
         gamma = np.clip(gamma, 0.5, 2.0)
         return apply_gamma_correction(image, gamma)
@@ -126,7 +147,7 @@ def apply_gamma_correction(image: np.ndarray, gamma: float = 1.0) -> np.ndarray:
     """
     # Crear tabla de lookup
     inv_gamma = 1.0 / gamma
-    table = np.array([((i / 255.0) ** inv_gamma) * 255 for i in np.arange(0, 256)]).astype(np.uint8)
+    table = (np.power(np.arange(256) / 255.0, inv_gamma) * 255).astype(np.uint8)
 
     return cv2.LUT(image, table)
 
@@ -144,14 +165,12 @@ def apply_color_correction(image: np.ndarray) -> np.ndarray:
     # Método de balance de blancos perfecto
     result = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
 
-    # Calcular promedio de cada canal en LAB
-    avg_l = np.mean(result[:, :, 0])
-    avg_a = np.mean(result[:, :, 1])
-    avg_b = np.mean(result[:, :, 2])
+    # Promedio de los tres canales LAB en una sola pasada
+    _, avg_a, avg_b, _ = cv2.mean(result)
 
-    # Ajustar canales a y b para neutralizar
-    result[:, :, 1] = result[:, :, 1] - ((avg_a - 128) * 0.5)
-    result[:, :, 2] = result[:, :, 2] - ((avg_b - 128) * 0.5)
+    # Ajustar canales a y b para neutralizar (resta saturada a uint8)
+    offset = (0.0, (avg_a - 128) * 0.5, (avg_b - 128) * 0.5, 0.0)
+    result = cv2.subtract(result, offset)
 
     return cv2.cvtColor(result, cv2.COLOR_LAB2BGR)
 
@@ -167,8 +186,26 @@ def apply_hdr_tone_mapping(image: np.ndarray, intensity: float = 1.0) -> np.ndar
     Returns:
         Imagen con tone mapping
     """
+    # uint8: la curva se evalúa sobre los 256 valores y se aplica con cv2.LUT
+    if image.dtype == np.uint8:
+        return cv2.LUT(image, _hdr_tone_curve(np.arange(256, dtype=np.float32), intensity))
+
+    return _hdr_tone_curve(image.astype(np.float32), intensity)
+
+
+def _hdr_tone_curve(values: np.ndarray, intensity: float) -> np.ndarray:
+    """
+    Curva de tone mapping Reinhard + gamma sobre valores float32 en [0, 255].
+
+    Args:
+        values: Valores float32 (imagen o tabla LUT)
+        intensity: Intensidad del efecto
+
+    Returns:
+        Valores mapeados uint8
+    """
     # Convertir a float
-    img_float = image.astype(np.float32) / 255.0
+    img_float = values / 255.0
 
     # Aplicar Reinhard tone mapping simple
     img_float = img_float / (1.0 + img_float)
@@ -62,6 +62,118 @@ def test_basic_functionality():
         print(f"❌ Error en funcionalidad básica: {e}")
         return False
 
+def test_result_cache(tmp_path, monkeypatch):
+    """El cache de resultados reconstruye la descarga y omite métodos aleatorios."""
+    import io
+    import cv2
+    import numpy as np
+    import app as app_module
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('temp_uploads')
+    app_module._result_cache.clear()
+    client = app_module.app.test_client()
+    png = cv2.imencode('.png', np.random.randint(0, 255, (32, 32, 3), dtype=np.uint8))[1].tobytes()
+
+    def post(filename, method):
+        return client.post('/process', content_type='multipart/form-data',
+                           data={'image': (io.BytesIO(png), filename), 'enhancement_method': method})
+
+    first = post('a.png', 'black_white').get_json()
+    hits = app_module._result_cache_stats['hits']
+    second = post('b.png', 'black_white').get_json()
+
+    # Acierto de cache: mismo resultado, pero descarga con el nombre de la subida actual
+    assert app_module._result_cache_stats['hits'] == hits + 1
+    assert second['image'] == first['image']
+    assert second['download_url'] == '/download/processed_b.png'
+    assert os.path.exists(os.path.join('temp_uploads', 'processed_b.png'))
+
+    # El granulado vintage es aleatorio: nunca se cachea
+    entries = len(app_module._result_cache)
+    post('c.png', 'vintage_filters')
+    post('c.png', 'vintage_filters')
+    assert len(app_module._result_cache) == entries
+    assert app_module._result_cache_stats['hits'] == hits + 1
+    print("✅ Cache de resultados: OK")
+
+
+def test_srcnn_tiled_forward():
+    """El forward por tiles coincide exactamente con el forward completo."""
+    import torch
+    from src.models import SRCNN
+    from src.pipeline import _srcnn_forward_tiled
+
+    torch.manual_seed(0)
+    model = SRCNN(scale_factor=2).eval()
+    # Misma disposición de memoria que usa el pipeline
+    tensor_image = torch.rand(1, 3, 300, 420).contiguous(memory_format=torch.channels_last)
+
+    with torch.inference_mode():
+        full = model(tensor_image)
+        tiled = _srcnn_forward_tiled(model, tensor_image, tile=128, pad=16)
+
+    assert tiled.shape == full.shape
+    assert (tiled - full).abs().max().item() == 0.0
+    print("✅ SRCNN por tiles: OK")
+
+
+def test_dataset_cache(tmp_path):
+    """build_cache genera memmaps planares que reproducen las muestras originales."""
+    import cv2
+    import numpy as np
+    from src.dataset import SuperResolutionDataset, ToUint8Tensor, FusedNormalize, dequantize
+
+    hr_dir, lr_dir = tmp_path / 'hr', tmp_path / 'lr'
+    hr_dir.mkdir()
+    lr_dir.mkdir()
+    for i in range(3):
+        cv2.imwrite(str(hr_dir / f'{i}.png'), np.random.randint(0, 255, (16, 16, 3), dtype=np.uint8))
+        cv2.imwrite(str(lr_dir / f'{i}.png'), np.random.randint(0, 255, (8, 8, 3), dtype=np.uint8))
+
+    cache_path = str(tmp_path / 'cache')
+    hr_npy, lr_npy = SuperResolutionDataset.build_cache(str(hr_dir), str(lr_dir), cache_path)
+    assert np.load(hr_npy, mmap_mode='r').shape == (3, 3, 16, 16)
+    assert np.load(lr_npy, mmap_mode='r').shape == (3, 3, 8, 8)
+
+    plain = SuperResolutionDataset(str(hr_dir), str(lr_dir), transform=ToUint8Tensor())
+    cached = SuperResolutionDataset(str(hr_dir), str(lr_dir), transform=ToUint8Tensor(),
+                                    cache_path=cache_path)
+    assert isinstance(cached._hr_cache, np.memmap)
+    for (lr_a, hr_a), (lr_b, hr_b) in zip(plain, cached):
+        assert lr_a.dtype == lr_b.dtype
+        assert (lr_a == lr_b).all() and (hr_a == hr_b).all()
+
+    # dequantize sobre uint8 equivale a la normalización a [-1, 1] en CPU
+    reference = SuperResolutionDataset(str(hr_dir), str(lr_dir), transform=FusedNormalize())
+    lr_uint8, hr_uint8 = cached[0]
+    lr_ref, hr_ref = reference[0]
+    assert (dequantize(lr_uint8) - lr_ref).abs().max().item() < 1e-6
+    assert (dequantize(hr_uint8) - hr_ref).abs().max().item() < 1e-6
+    print("✅ Cache del dataset y dequantize: OK")
+
+
+def test_quantize_model_int8():
+    """La cuantización int8 conserva la forma de salida y se aproxima al modelo float."""
+    import torch
+    from src.models import SRCNN, quantize_model_int8
+
+    torch.manual_seed(0)
+    model = SRCNN(scale_factor=2).eval()
+    calibration = [torch.rand(1, 3, 32, 32) for _ in range(4)]
+    quantized = quantize_model_int8(model, calibration)
+
+    tensor_image = torch.rand(1, 3, 32, 32)
+    with torch.inference_mode():
+        expected = model(tensor_image)
+        output = quantized(tensor_image)
+
+    assert output.shape == expected.shape == (1, 3, 64, 64)
+    assert quantized.scale_factor == 2
+    assert (output - expected).abs().mean().item() < 0.05
+    print("✅ Cuantización int8: OK")
+
+
 if __name__ == "__main__":
     print("🚀 Probando sistema de restauración y enhancement...\n")
 
@@ -5,19 +5,115 @@ Script completo y funcional para CPU con métricas profesionales.
 
 import argparse
 import os
+import random
 from pathlib import Path
+from typing import Optional
+
+import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 from torch.utils.data import DataLoader
-from datasets import load_dataset
+from datasets import load_dataset, load_from_disk
 from tqdm import tqdm
 
 # Imports del proyecto
-from src.dataset import SuperResolutionDataset, HFDatasetAdapter
-from src.models import create_model, save_model_checkpoint
+from src.dataset import SuperResolutionDataset, HFDatasetAdapter, ToUint8Tensor, create_data_transforms, dequantize
+from src.models import create_model, compile_model, save_model_checkpoint
 from src.metrics import SRMetrics, log_training_metrics, evaluate_model
-from src.utils import create_data_transforms
+
+# Segmentos expandibles del allocator CUDA (PyTorch >= 2.1, CUDA >= 11.4): evita la
+# fragmentación "reserved but unallocated". El allocator lee la variable en la primera
+# reserva en GPU, así que basta con fijarla tras importar torch; versiones previas la rechazan.
+if torch.__version__ >= "2.1":
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+
+# Directorio donde se guardan los splits train/val de los datasets HF
+HF_CACHE_DIR = Path(".hf_cache")
+
+# Cada cuántos batches de entrenamiento se calculan PSNR/SSIM (la validación usa todos)
+METRIC_EVERY = 10
+
+# Cada cuántos batches se actualiza la barra de progreso (cada .item() sincroniza con la GPU);
+# múltiplo de METRIC_EVERY para que en entrenamiento coincida con un batch con métricas
+POSTFIX_EVERY = 20
+
+
+class CUDAPrefetcher:
+    """
+    Envuelve un DataLoader y copia el batch siguiente al dispositivo en un
+    stream CUDA secundario mientras se procesa el actual. Los batches se
+    entregan en formato channels_last y, si llegan en uint8, normalizados a
+    [-1, 1] ya en el dispositivo.
+    """
+
+    def __init__(self, loader: DataLoader, device: torch.device):
+        """
+        Inicializa el prefetcher.
+
+        Args:
+            loader: DataLoader que produce pares (lr, hr)
+            device: Dispositivo destino
+        """
+        self.loader = loader
+        self.device = device
+
+    def __len__(self) -> int:
+        return len(self.loader)
+
+    def __iter__(self):
+        if self.device.type != 'cuda':
+            for lr_batch, hr_batch in self.loader:
+                yield _to_device(lr_batch, self.device), _to_device(hr_batch, self.device)
+            return
+
+        stream = torch.cuda.Stream(device=self.device)
+        batches = iter(self.loader)
+        next_batch = self._preload(batches, stream)
+
+        while next_batch is not None:
+            current = torch.cuda.current_stream(self.device)
+            current.wait_stream(stream)
+            lr_batch, hr_batch = next_batch
+            # Memoria reservada en el stream secundario pero usada en el principal
+            lr_batch.record_stream(current)
+            hr_batch.record_stream(current)
+
+            next_batch = self._preload(batches, stream)
+            yield lr_batch, hr_batch
+
+    def _preload(self, batches, stream):
+        """Lanza la copia asíncrona del siguiente batch (None al terminar)."""
+        try:
+            lr_batch, hr_batch = next(batches)
+        except StopIteration:
+            return None
+
+        with torch.cuda.stream(stream):
+            lr_batch = _to_device(lr_batch, self.device, non_blocking=True)
+            hr_batch = _to_device(hr_batch, self.device, non_blocking=True)
+        return lr_batch, hr_batch
+
+
+def _to_device(x: torch.Tensor, device: torch.device, non_blocking: bool = False) -> torch.Tensor:
+    """
+    Mueve un batch al dispositivo en NHWC y normaliza en destino si viene en uint8.
+
+    Args:
+        x: Batch (N, C, H, W) uint8 o float
+        device: Dispositivo destino
+        non_blocking: Copia asíncrona (memoria pinned)
+
+    Returns:
+        Batch float en [-1, 1], channels_last
+    """
+    # NHWC, igual que los pesos del modelo (create_model usa channels_last)
+    x = x.to(device, non_blocking=non_blocking, memory_format=torch.channels_last)
+    if x.dtype == torch.uint8:
+        # La copia H2D viaja en 1 byte por canal; la normalización se hace aquí
+        x = dequantize(x)
+    return x
 
 
 def train_model(
@@ -27,7 +123,13 @@ def train_model(
     learning_rate: float = 1e-3,
     dataset_path: str = None,
     hf_dataset: str = "MCG-NJU/vdsr-2k",
-    model_name: str = "srcnn"
+    model_name: str = "srcnn",
+    upsampling: str = "bilinear",
+    num_workers: Optional[int] = None,
+    compile: bool = True,
+    amp: bool = True,
+    cache_in_memory: bool = False,
+    cache_path: Optional[str] = None
 ):
     """
     Función principal de entrenamiento del modelo de super-resolución.
@@ -40,6 +142,12 @@ def train_model(
         dataset_path: Ruta a dataset local (opcional)
         hf_dataset: Nombre del dataset en HF
         model_name: Nombre del modelo a usar
+        upsampling: Upsampling del modelo ('bilinear' o 'pixelshuffle')
+        num_workers: Workers del DataLoader (por defecto, según CPUs disponibles)
+        compile: Compilar el modelo con torch.compile (solo en CUDA)
+        amp: Entrenar con precisión mixta BF16/FP16 (solo en CUDA)
+        cache_in_memory: Mantener decodificado en memoria el dataset local
+        cache_path: Prefijo del cache .npy del dataset local (se crea si no existe)
     """
     print(f"🚀 Iniciando entrenamiento {model_name.upper()}")
     print(f"   📊 Epochs: {epochs}, Batch size: {batch_size}, Scale: {scale_factor}x")
@@ -48,6 +156,13 @@ def train_model(
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     print(f"   💻 Device: {device}")
 
+    if device.type == 'cuda':
+        # Shapes fijos por batch: cuDNN elige el algoritmo de conv más rápido una vez
+        torch.backends.cudnn.benchmark = True
+        torch.backends.cudnn.deterministic = False
+        # TF32 en matmul (Ampere+)
+        torch.set_float32_matmul_precision('high')
+
     # Preparar dataset
     if dataset_path and Path(dataset_path).exists():
         # Usar dataset local
@@ -56,57 +171,92 @@ def train_model(
 
         if hr_dir.exists() and lr_dir.exists():
             print(f"📁 Usando dataset local: {dataset_path}")
-            train_dataset = SuperResolutionDataset(str(hr_dir), str(lr_dir), scale_factor)
+            if cache_path and not os.path.exists(cache_path + '_hr.npy'):
+                # Empaquetar una sola vez; las siguientes ejecuciones leen el memory-map
+                print(f"   🗄️  Construyendo cache del dataset: {cache_path}_{{hr,lr}}.npy")
+                SuperResolutionDataset.build_cache(str(hr_dir), str(lr_dir), cache_path)
+            # Muestras uint8 hasta el dispositivo (4x menos bytes por batch); ver _to_device
+            train_dataset = SuperResolutionDataset(str(hr_dir), str(lr_dir), scale_factor,
+                                                   transform=ToUint8Tensor(),
+                                                   cache_in_memory=cache_in_memory,
+                                                   cache_path=cache_path)
             # Para validación, usar mismo dataset (en producción separar)
             val_dataset = train_dataset
+            print("⚠️  val == train: se omite la validación duplicada hasta la última época. "
+                  "Proporciona un directorio val/ separado para una validación real.")
         else:
             raise FileNotFoundError(f"Directorios HR/LR no encontrados en {dataset_path}")
     else:
-        # Usar dataset de Hugging Face
-        print(f"📥 Cargando dataset HF: {hf_dataset}")
-        hf_data = load_dataset(hf_dataset, split='train')
+        # Usar dataset de Hugging Face (split train/val cacheado en disco como Arrow)
+        cache_dir = HF_CACHE_DIR / hf_dataset.replace('/', '_')
+        if cache_dir.exists():
+            print(f"📥 Cargando dataset HF desde cache: {cache_dir}")
+            hf_splits = load_from_disk(str(cache_dir))
+        else:
+            print(f"📥 Cargando dataset HF: {hf_dataset}")
+            hf_data = load_dataset(hf_dataset, split='train')
 
-        # Dividir en train/val
-        train_size = int(0.8 * len(hf_data))
-        train_split = hf_data.select(range(train_size))
-        val_split = hf_data.select(range(train_size, len(hf_data)))
+            # Dividir en train/val (80/20) y guardar para memory-map en siguientes ejecuciones
+            hf_splits = hf_data.train_test_split(test_size=0.2, seed=42)
+            hf_splits.save_to_disk(str(cache_dir))
 
         # Crear datasets adaptados
-        train_dataset = HFDatasetAdapter(train_split, scale_factor=scale_factor)
-        val_dataset = HFDatasetAdapter(val_split, scale_factor=scale_factor)
+        train_dataset = HFDatasetAdapter(hf_splits['train'], scale_factor=scale_factor)
+        val_dataset = HFDatasetAdapter(hf_splits['test'], scale_factor=scale_factor)
+
+    val_is_train = val_dataset is train_dataset
+
+    # DataLoaders: la decodificación corre en workers y se solapa con el cómputo
+    loader_kwargs = _dataloader_kwargs(device, num_workers)
 
-    # DataLoaders
     train_loader = DataLoader(
         train_dataset,
         batch_size=batch_size,
         shuffle=True,
-        num_workers=0,  # CPU only
-        pin_memory=False
+        **loader_kwargs
     )
 
     val_loader = DataLoader(
         val_dataset,
         batch_size=batch_size,
         shuffle=False,
-        num_workers=0,
-        pin_memory=False
+        **loader_kwargs
     )
 
     print(f"   📊 Dataset: {len(train_dataset)} train, {len(val_dataset)} val")
+    print(f"   👷 DataLoader workers: {loader_kwargs['num_workers']}")
 
     # Crear modelo
-    model = create_model(model_name, scale_factor=scale_factor)
+    model = create_model(model_name, scale_factor=scale_factor, upsampling=upsampling)
     model.to(device)
 
     print(f"   🧠 Modelo: {model.__class__.__name__}")
     print(f"   🔢 Parámetros: {model.get_num_params():,}")
 
-    # Loss y optimizador
-    criterion = nn.MSELoss()
-    optimizer = optim.Adam(model.parameters(), lr=learning_rate)
+    # torch.compile fusiona conv + bias + ReLU en forward y backward
+    if compile and device.type == 'cuda':
+        model = compile_model(model, mode='max-autotune')
+        print("   ⚡ Modelo compilado con torch.compile")
+
+    # Optimizador (la pérdida es F.mse_loss)
+    optimizer = _create_optimizer(model, learning_rate, device)
+
+    # Precisión mixta: BF16 si la GPU lo soporta (sin escalado), si no FP16 + GradScaler
+    use_amp = amp and device.type == 'cuda'
+    amp_dtype = torch.bfloat16 if use_amp and torch.cuda.is_bf16_supported() else torch.float16
+    use_scaler = use_amp and amp_dtype == torch.float16
+    if hasattr(torch.amp, 'GradScaler'):
+        scaler = torch.amp.GradScaler('cuda', enabled=use_scaler)
+    else:
+        # torch < 2.3: el GradScaler solo existe en torch.cuda.amp
+        scaler = torch.cuda.amp.GradScaler(enabled=use_scaler)
+    if use_amp:
+        print(f"   🎛️  AMP: {str(amp_dtype).replace('torch.', '')}")
 
     # Métricas
-    metrics = SRMetrics(device=device)
+    # Instancias separadas: el estado acumulado de entrenamiento y validación no se mezcla
+    train_sr_metrics = SRMetrics(device=device)
+    val_sr_metrics = SRMetrics(device=device)
 
     # Directorios
     model_dir = Path("model")
@@ -114,6 +264,13 @@ def train_model(
     model_dir.mkdir(exist_ok=True)
     samples_dir.mkdir(exist_ok=True)
 
+    # Muestras fijas para _save_training_samples, leídas una sola vez del dataset
+    # (next(iter(val_loader)) arrancaría y descartaría los workers en cada llamada)
+    if epochs >= 5:
+        sample_pairs = [val_dataset[i] for i in range(min(2, len(val_dataset)))]
+        sample_lr = _to_device(torch.stack([lr for lr, _ in sample_pairs]), device)
+        sample_hr = _to_device(torch.stack([hr for _, hr in sample_pairs]), device)
+
     # Variables de seguimiento
     best_psnr = 0.0
     training_log = []
@@ -124,70 +281,55 @@ def train_model(
     for epoch in range(epochs):
         # === ENTRENAMIENTO ===
         model.train()
-        train_loss = 0.0
-        train_metrics = {'psnr': 0.0, 'ssim': 0.0}
+        train_sr_metrics.reset()
+        # Acumuladores en el dispositivo: una sola sincronización por época
+        train_loss_t = torch.zeros((), device=device)
+        train_metrics_t = {'psnr': torch.zeros((), device=device), 'ssim': torch.zeros((), device=device)}
         num_train_batches = 0
+        num_metric_batches = 0
 
-        train_pbar = tqdm(train_loader, desc=f"Epoch {epoch+1:2d}/{epochs} [Train]")
+        # El prefetcher entrega los batches ya en el dispositivo
+        train_pbar = tqdm(CUDAPrefetcher(train_loader, device), desc=f"Epoch {epoch+1:2d}/{epochs} [Train]")
         for lr_batch, hr_batch in train_pbar:
-            lr_batch = lr_batch.to(device)
-            hr_batch = hr_batch.to(device)
-
-            optimizer.zero_grad()
-            outputs = model(lr_batch)
-            loss = criterion(outputs, hr_batch)
-            loss.backward()
-            optimizer.step()
-
-            train_loss += loss.item()
-
-            # Calcular métricas en batch
-            batch_metrics = metrics(lr_batch, hr_batch)
-            for key in train_metrics:
-                train_metrics[key] += batch_metrics[key].item()
+            optimizer.zero_grad(set_to_none=True)
+            with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=use_amp):
+                outputs = model(lr_batch)
+                loss = F.mse_loss(outputs.float(), hr_batch)
+            scaler.scale(loss).backward()
+            scaler.step(optimizer)
+            scaler.update()
+
+            train_loss_t += loss.detach()
+
+            # Métricas en uno de cada METRIC_EVERY batches (SSIM cuesta casi un forward)
+            if num_train_batches % METRIC_EVERY == 0:
+                batch_metrics = train_sr_metrics(outputs.detach().float(), hr_batch)
+                for key in train_metrics_t:
+                    train_metrics_t[key] += batch_metrics[key].detach()
+                num_metric_batches += 1
+
+                # Barra de progreso solo en batches con métricas recién calculadas
+                if num_train_batches % POSTFIX_EVERY == 0:
+                    train_pbar.set_postfix({
+                        'loss': f"{loss.item():.4f}",
+                        'psnr': f"{batch_metrics['psnr'].item():.2f}"
+                    })
             num_train_batches += 1
 
-            train_pbar.set_postfix({
-                'loss': f"{loss.item():.4f}",
-                'psnr': f"{batch_metrics['psnr'].item():.2f}"
-            })
-
         # Promedios de entrenamiento
-        avg_train_loss = train_loss / len(train_loader)
-        for key in train_metrics:
-            train_metrics[key] /= num_train_batches
+        avg_train_loss = train_loss_t.item() / len(train_loader)
+        train_metrics = {key: value.item() / num_metric_batches for key, value in train_metrics_t.items()}
 
         # === VALIDACIÓN ===
-        model.eval()
-        val_loss = 0.0
-        val_metrics = {'psnr': 0.0, 'ssim': 0.0}
-        num_val_batches = 0
-
-        with torch.no_grad():
-            val_pbar = tqdm(val_loader, desc=f"Epoch {epoch+1:2d}/{epochs} [Val]  ")
-            for lr_batch, hr_batch in val_pbar:
-                lr_batch = lr_batch.to(device)
-                hr_batch = hr_batch.to(device)
-
-                outputs = model(lr_batch)
-                loss = criterion(outputs, hr_batch)
-                val_loss += loss.item()
-
-                # Calcular métricas
-                batch_metrics = metrics(lr_batch, hr_batch)
-                for key in val_metrics:
-                    val_metrics[key] += batch_metrics[key].item()
-                num_val_batches += 1
-
-                val_pbar.set_postfix({
-                    'loss': f"{loss.item():.4f}",
-                    'psnr': f"{batch_metrics['psnr'].item():.2f}"
-                })
-
-        # Promedios de validación
-        avg_val_loss = val_loss / len(val_loader)
-        for key in val_metrics:
-            val_metrics[key] /= num_val_batches
+        validated = not (val_is_train and epoch < epochs - 1)
+        if not validated:
+            # Mismo dataset que entrenamiento: reutilizar sus métricas salvo en la última época
+            avg_val_loss, val_metrics = avg_train_loss, dict(train_metrics)
+        else:
+            avg_val_loss, val_metrics = _validate(
+                model, val_loader, val_sr_metrics, device, use_amp, amp_dtype,
+                desc=f"Epoch {epoch+1:2d}/{epochs} [Val]  "
+            )
 
         # Logging
         log_entry = {
@@ -209,8 +351,11 @@ def train_model(
         print(f"   Val PSNR:   {val_metrics['psnr']:.2f} dB")
         print(f"   Train SSIM: {train_metrics['ssim']:.4f}")
         print(f"   Val SSIM:   {val_metrics['ssim']:.4f}")
-        # Guardar mejor modelo
-        if val_metrics['psnr'] > best_psnr:
+        if not validated:
+            print("   (sin validación en esta época: Val = métricas de entrenamiento)")
+
+        # Guardar mejor modelo (solo con métricas de una validación real)
+        if validated and val_metrics['psnr'] > best_psnr:
             best_psnr = val_metrics['psnr']
             checkpoint_path = model_dir / f"{model_name}_best.pth"
             save_model_checkpoint(
@@ -221,7 +366,7 @@ def train_model(
 
         # Guardar samples cada 5 epochs
         if (epoch + 1) % 5 == 0:
-            _save_training_samples(model, val_loader, epoch + 1, samples_dir, device)
+            _save_training_samples(model, sample_lr, sample_hr, epoch + 1, samples_dir)
 
     # Guardar modelo final
     final_checkpoint = model_dir / f"{model_name}_final.pth"
@@ -234,48 +379,149 @@ def train_model(
     return model
 
 
-def _save_training_samples(model, val_loader, epoch, save_dir, device, num_samples=2):
-    """Guarda imágenes de ejemplo durante el entrenamiento."""
+def _validate(model, val_loader, metrics, device, use_amp, amp_dtype, desc):
+    """
+    Ejecuta una pasada de validación.
+
+    Args:
+        model: Modelo a evaluar
+        val_loader: DataLoader de validación
+        metrics: SRMetrics
+        device: Dispositivo
+        use_amp: Usar autocast
+        amp_dtype: Tipo de autocast
+        desc: Descripción de la barra de progreso
+
+    Returns:
+        Tuple: (pérdida media, dict de métricas medias)
+    """
     model.eval()
+    metrics.reset()
+    val_loss_t = torch.zeros((), device=device)
+    val_metrics_t = {'psnr': torch.zeros((), device=device), 'ssim': torch.zeros((), device=device)}
+    num_val_batches = 0
+
+    with torch.inference_mode():
+        val_pbar = tqdm(CUDAPrefetcher(val_loader, device), desc=desc)
+        for lr_batch, hr_batch in val_pbar:
+            with torch.autocast(device_type=device.type, dtype=amp_dtype, enabled=use_amp):
+                outputs = model(lr_batch)
+            outputs = outputs.float()
+            loss = F.mse_loss(outputs, hr_batch)
+            val_loss_t += loss
 
-    with torch.no_grad():
-        lr_batch, hr_batch = next(iter(val_loader))
-        lr_batch = lr_batch[:num_samples].to(device)
-        hr_batch = hr_batch[:num_samples].to(device)
+            # Calcular métricas
+            batch_metrics = metrics(outputs, hr_batch)
+            for key in val_metrics_t:
+                val_metrics_t[key] += batch_metrics[key]
+            num_val_batches += 1
 
+            if num_val_batches % POSTFIX_EVERY == 0:
+                val_pbar.set_postfix({
+                    'loss': f"{loss.item():.4f}",
+                    'psnr': f"{batch_metrics['psnr'].item():.2f}"
+                })
+
+    # Promedios de validación
+    avg_val_loss = val_loss_t.item() / len(val_loader)
+    val_metrics = {key: value.item() / num_val_batches for key, value in val_metrics_t.items()}
+    return avg_val_loss, val_metrics
+
+
+def _create_optimizer(model: nn.Module, learning_rate: float, device: torch.device) -> optim.Optimizer:
+    """
+    Crea Adam con la implementación multi-tensor más rápida disponible.
+
+    Args:
+        model: Modelo a optimizar
+        learning_rate: Tasa de aprendizaje
+        device: Dispositivo de entrenamiento
+
+    Returns:
+        Optimizador Adam (fused en CUDA, foreach en otro caso)
+    """
+    if device.type == 'cuda':
+        try:
+            # Un solo kernel actualiza todos los parámetros
+            return optim.Adam(model.parameters(), lr=learning_rate, fused=True)
+        except (TypeError, RuntimeError):
+            pass
+    return optim.Adam(model.parameters(), lr=learning_rate, foreach=True)
+
+
+def _dataloader_kwargs(device: torch.device, num_workers: Optional[int] = None) -> dict:
+    """
+    Argumentos comunes de los DataLoaders de entrenamiento y validación.
+
+    Args:
+        device: Dispositivo de entrenamiento
+        num_workers: Número de workers (None = automático según CPUs)
+
+    Returns:
+        Dict de kwargs para DataLoader
+    """
+    cpu_count = os.cpu_count() or 1
+    if num_workers is None:
+        if device.type == 'cpu' and cpu_count <= 2:
+            num_workers = 0
+        else:
+            num_workers = min(8, cpu_count // 2)
+
+    kwargs = {
+        'num_workers': num_workers,
+        'pin_memory': device.type == 'cuda'
+    }
+    if num_workers > 0:
+        # Workers vivos entre épocas y varios batches preparados por adelantado
+        kwargs.update(
+            persistent_workers=True,
+            prefetch_factor=4,
+            worker_init_fn=_seed_worker
+        )
+    return kwargs
+
+
+def _seed_worker(worker_id: int):
+    """Siembra numpy/random en cada worker a partir de la semilla de torch."""
+    seed = torch.initial_seed() % 2 ** 32
+    np.random.seed(seed)
+    random.seed(seed)
+
+
+def _save_training_samples(model, lr_batch, hr_batch, epoch, save_dir):
+    """Guarda imágenes de ejemplo (batch LR/HR ya en el dispositivo) durante el entrenamiento."""
+    model.eval()
+    num_samples = lr_batch.shape[0]
+
+    with torch.inference_mode():
         sr_batch = model(lr_batch)
 
-        # Convertir a imágenes
-        from torchvision.transforms import ToPILImage
-        to_pil = ToPILImage()
-
-        for i in range(num_samples):
-            # LR
-            lr_img = to_pil(lr_batch[i].cpu())
-            lr_img.save(save_dir / f"epoch_{epoch}_sample_{i}_lr.png")
-            # SR
-            sr_img = to_pil(torch.clamp(sr_batch[i].cpu(), 0, 1))
-            sr_img.save(save_dir / f"epoch_{epoch}_sample_{i}_sr.png")
-            # HR
-            hr_img = to_pil(hr_batch[i].cpu())
-            hr_img.save(save_dir / f"epoch_{epoch}_sample_{i}_hr.png")
+        # Una rejilla por tipo (LR/SR/HR), cuantizada y guardada en una sola llamada
+        from torchvision.utils import save_image
+
+        # Los tensores están en [-1, 1]: pasar a [0, 1] antes de cuantizar
+        for name, batch in (('lr', lr_batch), ('sr', sr_batch), ('hr', hr_batch)):
+            save_image(batch.add(1.0).mul_(0.5).clamp_(0, 1),
+                       save_dir / f"epoch_{epoch}_{name}.png", nrow=num_samples)
+
+
 def _save_training_log(log_data, log_path):
-    """Guarda el log de entrenamiento en formato legible."""
+    """Guarda el log de entrenamiento en formato legible (una sola escritura)."""
+    lines = [
+        "Training Log",
+        "=" * 50,
+        f"{'Epoch':<8}{'TrainLoss':<12}{'ValLoss':<12}{'TrainPSNR':<10}{'ValPSNR':<10}{'TrainSSIM':<10}{'ValSSIM':<10}",
+        "-" * 70
+    ]
+    lines.extend(
+        f"{entry['epoch']:<8}{entry['train_loss']:<12.4f}{entry['val_loss']:<12.4f}"
+        f"{entry['train_psnr']:<10.2f}{entry['val_psnr']:<10.4f}"
+        f"{entry['train_ssim']:<10.2f}{entry['val_ssim']:<10.4f}"
+        for entry in log_data
+    )
+
     with open(log_path, 'w') as f:
-        f.write("Training Log\n")
-        f.write("=" * 50 + "\n")
-        f.write(f"{'Epoch':<8}")
-        f.write("-" * 70 + "\n")
-
-        for entry in log_data:
-            f.write(f"{entry['epoch']:<8}")
-            f.write(f"{entry['train_loss']:<12.4f}")
-            f.write(f"{entry['val_loss']:<12.4f}")
-            f.write(f"{entry['train_psnr']:<10.2f}")
-            f.write(f"{entry['val_psnr']:<10.4f}")
-            f.write(f"{entry['train_ssim']:<10.2f}")
-            f.write(f"{entry['val_ssim']:<10.4f}")
-            f.write("\n")
+        f.write("\n".join(lines) + "\n")
 
     print(f"📝 Log guardado en {log_path}")
 
@@ -296,9 +542,29 @@ if __name__ == "__main__":
                        help='Dataset de HF a usar (default: MCG-NJU/vdsr-2k)')
     parser.add_argument('--model', type=str, default='srcnn', choices=['srcnn', 'enhanced_srcnn'],
                        help='Modelo a usar (default: srcnn)')
+    parser.add_argument('--upsampling', type=str, default='bilinear', choices=['bilinear', 'pixelshuffle'],
+                       help='Upsampling: bilinear previo o PixelShuffle en LR (default: bilinear)')
+    parser.add_argument('--num_workers', type=int, default=None,
+                       help='Workers del DataLoader (default: automático según CPUs)')
+    parser.add_argument('--no_compile', action='store_true',
+                       help='Desactivar torch.compile (útil para depurar)')
+    parser.add_argument('--cache_in_memory', action='store_true',
+                       help='Decodificar el dataset local una sola vez y mantenerlo en memoria')
+    parser.add_argument('--cache_path', '--cache-path', dest='cache_path', type=str, default=None,
+                       help='Prefijo del cache .npy del dataset local (se construye la primera vez)')
+    parser.add_argument('--alloc_conf', type=str, default=None,
+                       help='Valor de PYTORCH_CUDA_ALLOC_CONF (default: expandable_segments:True)')
+    parser.add_argument('--amp', dest='amp', action='store_true', default=True,
+                       help='Entrenar con precisión mixta en CUDA (default)')
+    parser.add_argument('--no_amp', dest='amp', action='store_false',
+                       help='Entrenar en FP32')
 
     args = parser.parse_args()
 
+    # El allocator CUDA lee la configuración al primer uso, así que basta con fijarla aquí
+    if args.alloc_conf is not None:
+        os.environ['PYTORCH_CUDA_ALLOC_CONF'] = args.alloc_conf
+
     # Ejecutar entrenamiento
     trained_model = train_model(
         epochs=args.epochs,
@@ -307,7 +573,13 @@ if __name__ == "__main__":
         learning_rate=args.lr,
         dataset_path=args.dataset_path,
         hf_dataset=args.hf_dataset,
-        model_name=args.model
+        model_name=args.model,
+        upsampling=args.upsampling,
+        num_workers=args.num_workers,
+        compile=not args.no_compile,
+        amp=args.amp,
+        cache_in_memory=args.cache_in_memory,
+        cache_path=args.cache_path
     )
 
     print("🎉 ¡Entrenamiento completado exitosamente!")
\ No newline at end of file